@@ -0,0 +1,126 @@
+"""
+Benchmark for the FTS5 search index.
+
+Builds a synthetic corpus (default: 100k chunks) in a temporary database and
+reports index size and query latency for English and Chinese queries.
+
+Usage:
+    cd backend
+    python -m benchmarks.bench_search --chunks 100000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import percentile, write_results  # noqa: E402
+from persistent_storage import PersistentStore  # noqa: E402
+
+EN_WORDS = (
+    "model translation document markdown server stream token chunk latency "
+    "embedding reasoning agent dataset benchmark evaluation training inference "
+    "kitchen object navigate trajectory observation planning reflection"
+).split()
+ZH_WORDS = (
+    "模型 翻译 文档 服务器 流式 分块 延迟 推理 智能体 数据集 基准 评估 训练 "
+    "厨房 物体 导航 轨迹 观察 规划 反思 具身 任务"
+).split()
+
+EN_QUERIES = ["translation", "kitchen object", "reasoning agent", "benchmark"]
+ZH_QUERIES = ["翻译", "智能体", "具身 任务", "数据集"]
+# Two-character words that occur nowhere in the corpus, so the query cannot stop early
+ZH_MISS_QUERIES = ["火箭", "海洋"]
+
+
+def make_chunk(rng: random.Random, index: int, words_per_chunk: int) -> dict:
+    raw = " ".join(rng.choice(EN_WORDS) for _ in range(words_per_chunk))
+    translated = "".join(rng.choice(ZH_WORDS) for _ in range(words_per_chunk))
+    return {
+        "chunk_index": index,
+        "raw_text": f"## Section {index}\n\n{raw}\n",
+        "translated_text": f"## 第 {index} 节\n\n{translated}\n",
+        "status": "completed",
+    }
+
+
+async def build_corpus(store: PersistentStore, total_chunks: int, chunks_per_doc: int, words_per_chunk: int):
+    rng = random.Random(42)
+    num_docs = max(1, total_chunks // chunks_per_doc)
+    for d in range(num_docs):
+        chunks = [make_chunk(rng, i, words_per_chunk) for i in range(chunks_per_doc)]
+        await store.create_document(f"doc-{d:06d}", f"Benchmark document {d}", "", chunks)
+
+
+async def time_queries(store: PersistentStore, queries, repeat: int):
+    latencies = []
+    hits = 0
+    for _ in range(repeat):
+        for q in queries:
+            start = time.perf_counter()
+            results = await store.search(q, limit=20)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len(results)
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "avg_hits": hits / len(latencies),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--chunks-per-doc", type=int, default=50)
+    parser.add_argument("--words-per-chunk", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/search-<rev>.json)")
+    args = parser.parse_args()
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        store = PersistentStore(db_path=db_path)
+
+        start = time.perf_counter()
+        await build_corpus(store, args.chunks, args.chunks_per_doc, args.words_per_chunk)
+        build_s = time.perf_counter() - start
+
+        import sqlite3
+        with sqlite3.connect(db_path) as conn:
+            fts_bytes = conn.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'search_%'"
+            ).fetchone()[0] if _has_dbstat(conn) else None
+        total_bytes = db_path.stat().st_size
+
+        print(f"chunks:          {args.chunks}")
+        print(f"build time:      {build_s:.1f}s")
+        print(f"database size:   {total_bytes / 1e6:.1f} MB")
+        if fts_bytes is not None:
+            print(f"search index:    {fts_bytes / 1e6:.1f} MB")
+        results = {"build_seconds": build_s, "database_mb": total_bytes / 1e6}
+        if fts_bytes is not None:
+            results["search_index_mb"] = fts_bytes / 1e6
+        for label, queries in (("en", EN_QUERIES), ("zh", ZH_QUERIES), ("zh_miss", ZH_MISS_QUERIES)):
+            stats = await time_queries(store, queries, args.repeat)
+            results[f"query_{label}"] = stats
+            print(f"query [{label}]:".ljust(17) + f"p50={stats['p50_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms hits={stats['avg_hits']:.1f}")
+
+    params = {k: v for k, v in vars(args).items() if k != "output"}
+    write_results("search", params, results, args.output)
+
+
+def _has_dbstat(conn) -> bool:
+    try:
+        conn.execute("SELECT 1 FROM dbstat LIMIT 1")
+        return True
+    except Exception:
+        return False
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
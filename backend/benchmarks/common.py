@@ -0,0 +1,108 @@
+"""
+Shared helpers for the benchmark scripts: percentiles, run metadata and
+JSON result files that compare.py can diff across commits.
+"""
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile (p in 0-100); 0.0 for an empty list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """p50/p90/p99/max/mean of a list of samples"""
+    return {
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+        "mean": sum(values) / len(values) if values else 0.0,
+        "count": len(values),
+    }
+
+
+def git_revision() -> str:
+    """Short commit hash of the working tree, with -dirty when there are local changes"""
+    try:
+        rev = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+        dirty = subprocess.call(
+            ["git", "diff", "--quiet", "HEAD", "--", "."], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ) != 0
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_results(benchmark: str, params: Dict, results: Dict, output: Optional[str] = None) -> Path:
+    """
+    Write a result file with the run metadata.
+    Defaults to benchmarks/results/<benchmark>-<revision>.json.
+    """
+    revision = git_revision()
+    path = Path(output) if output else RESULTS_DIR / f"{benchmark}-{revision}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "benchmark": benchmark,
+        "revision": revision,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": params,
+        "results": results,
+    }
+    path.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Results written to {path}")
+    return path
+
+
+_WORDS = (
+    "the model translates markdown documents while keeping code blocks tables links "
+    "and headings intact so that reviewers can compare source and output side by side"
+).split()
+
+
+def synthetic_markdown(target_chars: int, seed: int = 0) -> str:
+    """
+    Deterministic markdown document of roughly target_chars characters with
+    H1/H2/H3 headings, paragraphs, lists, fenced code and tables.
+    """
+    import random
+
+    rng = random.Random(seed)
+
+    def sentence(n: int) -> str:
+        return " ".join(rng.choice(_WORDS) for _ in range(n)).capitalize() + "."
+
+    parts = ["# Synthetic Benchmark Document\n\n", sentence(20), "\n\n"]
+    size = sum(len(p) for p in parts)
+    section = 0
+    while size < target_chars:
+        section += 1
+        block = [f"## Section {section}\n\n", sentence(25), " ", sentence(30), "\n\n"]
+        for sub in range(1, 3):
+            block += [f"### Section {section}.{sub}\n\n", sentence(40), "\n\n"]
+            block += [f"- {sentence(8)}\n" for _ in range(3)] + ["\n"]
+        if section % 3 == 0:
+            block += ["```python\n", f"def section_{section}():\n    return {section}\n", "```\n\n"]
+        if section % 4 == 0:
+            block += ["| key | value |\n", "|---|---|\n", f"| section | {section} |\n", "| kind | table |\n\n"]
+        block += [sentence(15), " [link](https://example.com/", str(section), ").\n\n"]
+        parts += block
+        size += sum(len(p) for p in block)
+    return "".join(parts)
@@ -0,0 +1,52 @@
+"""
+Compare two benchmark result files (written by write_results).
+
+Usage:
+    cd backend
+    python -m benchmarks.compare benchmarks/results/load-abc123.json benchmarks/results/load-def456.json
+"""
+import argparse
+import json
+from typing import Dict
+
+
+def flatten(data: Dict, prefix: str = "") -> Dict[str, float]:
+    """Flatten nested result dicts into dotted keys, keeping numeric leaves"""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    if baseline["params"] != candidate["params"]:
+        print("warning: runs used different parameters, deltas may not be meaningful")
+    print(f"{baseline['benchmark']}: {baseline['revision']} -> {candidate['revision']}\n")
+
+    old, new = flatten(baseline["results"]), flatten(candidate["results"])
+    width = max((len(k) for k in old.keys() | new.keys()), default=10)
+    for key in sorted(old.keys() | new.keys()):
+        a, b = old.get(key), new.get(key)
+        if a is None or b is None:
+            print(f"{key:<{width}}  {a!s:>12}  {b!s:>12}")
+            continue
+        delta = f"{(b - a) / a * 100:+.1f}%" if a else ""
+        print(f"{key:<{width}}  {a:>12.4g}  {b:>12.4g}  {delta:>8}")
+
+
+if __name__ == "__main__":
+    main()
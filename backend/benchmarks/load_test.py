@@ -0,0 +1,366 @@
+"""
+End-to-end load test against the real app and a local mock LLM.
+
+Starts benchmarks.mock_llm_server and the backend (uvicorn main:app, on a
+throwaway database) as subprocesses, then drives concurrent clients that
+each POST /api/translate and follow the document over its WebSocket
+until the "complete" message. Reports throughput, latency percentiles,
+SQLite write rates (from /metrics), WebSocket traffic and backend RSS.
+
+With --kill-after, the backend is instead killed with SIGKILL while the
+documents are being translated and restarted on the same database; the
+interrupted documents are then resumed from their checkpoints (in partial
+mode) and every chunk is checked to hold exactly one copy of its translation.
+
+Usage:
+    cd backend
+    python -m benchmarks.load_test --clients 20 --documents 100 --doc-chars 20000
+    python -m benchmarks.load_test --clients 50 --rate-limit-rate 0.05 --error-rate 0.01
+    python -m benchmarks.load_test --clients 10 --documents 10 --kill-after 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import websockets
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import BACKEND_DIR, summarize, synthetic_markdown, write_results  # noqa: E402
+from benchmarks import mock_llm_server  # noqa: E402
+
+# PersistentStore methods that write to SQLite
+WRITE_METHODS = (
+    "create_document", "update_chunk", "update_document_status", "save_checkpoints",
+    "record_usage", "set_setting", "set_structure_index",
+)
+METRIC_LINE = re.compile(r'^(\w+)(?:\{(.*)\})? ([0-9.eE+-]+|\+Inf|NaN)$')
+
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    """Parse Prometheus text into {'name{labels}': value}"""
+    values = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            values[f"{name}{{{labels}}}" if labels else name] = float(value)
+    return values
+
+
+def metric_delta(before: Dict[str, float], after: Dict[str, float], key: str) -> float:
+    return after.get(key, 0.0) - before.get(key, 0.0)
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process in MB (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+async def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+async def run_document(client: httpx.AsyncClient, ws_base: str, content: str, index: int,
+                       timeout: float, created: Optional[Dict[str, int]] = None) -> Dict:
+    """Create one document and follow its translation to completion (created collects {doc_id: index})"""
+    start = time.perf_counter()
+    response = await client.post("/api/translate", json={"content": content, "title": f"bench {index}"})
+    response.raise_for_status()
+    created_at = time.perf_counter()
+    doc_id = response.json()["docId"]
+    num_chunks = len(response.json()["chunks"])
+    if created is not None:
+        created[doc_id] = index
+
+    async def follow(ws) -> Tuple[Optional[float], int, int]:
+        first_token = None
+        completed = errors = 0
+        async for raw in ws:
+            message = json.loads(raw)
+            if message.get("type") == "complete":
+                break
+            data = message.get("data", {})
+            if first_token is None and data.get("translatedText"):
+                first_token = time.perf_counter() - created_at
+            if data.get("status") == "completed":
+                completed += 1
+            elif data.get("status") == "error":
+                errors += 1
+        return first_token, completed, errors
+
+    async with websockets.connect(f"{ws_base}/ws/translate/{doc_id}?conn_id=bench_{index}",
+                                  max_size=None) as ws:
+        # asyncio.wait_for rather than asyncio.timeout, which needs Python 3.11
+        first_token, completed, errors = await asyncio.wait_for(follow(ws), timeout)
+
+    return {
+        "latency": time.perf_counter() - start,
+        "create_latency": created_at - start,
+        "first_token": first_token,
+        "chunks": num_chunks,
+        "chunks_completed": completed,
+        "chunks_failed": errors,
+    }
+
+
+async def drive(args, backend_url: str, backend_pid: int) -> Dict:
+    ws_base = backend_url.replace("http://", "ws://")
+    # Every document is distinct: repeated uploads would reuse finished chunks and skip the LLM
+    documents = [synthetic_markdown(args.doc_chars, seed=i) for i in range(args.documents)]
+    semaphore = asyncio.Semaphore(args.clients)
+    rss_samples: List[float] = []
+    results: List[Dict] = []
+    failures = 0
+
+    async with httpx.AsyncClient(base_url=backend_url, timeout=60.0) as client:
+        await client.post("/api/settings", json={"settings": {"num_chunks": args.num_chunks}})
+        before = parse_metrics((await client.get("/metrics")).text)
+
+        async def sample_memory():
+            while True:
+                value = rss_mb(backend_pid)
+                if value is not None:
+                    rss_samples.append(value)
+                await asyncio.sleep(0.5)
+
+        async def worker(i: int):
+            nonlocal failures
+            async with semaphore:
+                try:
+                    results.append(await run_document(
+                        client, ws_base, documents[i], i, args.timeout))
+                except Exception as e:
+                    failures += 1
+                    print(f"  document {i} failed: {type(e).__name__}: {e}")
+
+        sampler = asyncio.create_task(sample_memory())
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(args.documents)))
+        wall = time.perf_counter() - start
+        sampler.cancel()
+
+        after = parse_metrics((await client.get("/metrics")).text)
+
+    db_writes = sum(
+        metric_delta(before, after, f'mdt_sqlite_operation_seconds_count{{method="{m}"}}') for m in WRITE_METHODS
+    )
+    db_write_seconds = sum(
+        metric_delta(before, after, f'mdt_sqlite_operation_seconds_sum{{method="{m}"}}') for m in WRITE_METHODS
+    )
+    chunks_done = sum(r["chunks_completed"] for r in results)
+    return {
+        "wall_seconds": wall,
+        "documents_ok": len(results),
+        "documents_failed": failures,
+        "throughput": {
+            "documents_per_sec": len(results) / wall,
+            "chunks_per_sec": chunks_done / wall,
+        },
+        "latency_seconds": {
+            "document": summarize([r["latency"] for r in results]),
+            "create": summarize([r["create_latency"] for r in results]),
+            "first_token": summarize([r["first_token"] for r in results if r["first_token"] is not None]),
+        },
+        "chunks": {
+            "completed": chunks_done,
+            "failed": sum(r["chunks_failed"] for r in results),
+        },
+        "database": {
+            "writes": db_writes,
+            "writes_per_sec": db_writes / wall,
+            "mean_write_ms": db_write_seconds / db_writes * 1000 if db_writes else 0.0,
+        },
+        "websocket": {
+            "messages": metric_delta(before, after, "mdt_websocket_messages_total"),
+            "megabytes": metric_delta(before, after, "mdt_websocket_sent_bytes_total") / 1e6,
+        },
+        "backend_rss_mb": {
+            "start": rss_samples[0] if rss_samples else 0.0,
+            "peak": max(rss_samples) if rss_samples else 0.0,
+        },
+    }
+
+
+async def kill_and_resume(args, backend_url: str, restart: Callable[[], Awaitable[None]]) -> Dict:
+    """
+    Kill the backend in the middle of the run, restart it and let the interrupted
+    documents finish, then compare every chunk with the mock server's reply
+    """
+    ws_base = backend_url.replace("http://", "ws://")
+    documents = [synthetic_markdown(args.doc_chars, seed=i) for i in range(args.documents)]
+    semaphore = asyncio.Semaphore(args.clients)
+    created: Dict[str, int] = {}
+
+    async with httpx.AsyncClient(base_url=backend_url, timeout=60.0) as client:
+        await client.post("/api/settings", json={"settings": {"num_chunks": args.num_chunks}})
+
+        async def worker(i: int):
+            async with semaphore:
+                try:
+                    await run_document(client, ws_base, documents[i], i, args.timeout, created)
+                except Exception:
+                    pass  # expected for every document in flight when the backend is killed
+
+        clients = asyncio.gather(*(worker(i) for i in range(args.documents)))
+        await asyncio.sleep(args.kill_after)
+        print(f"Killing the backend with {len(created)} documents created...")
+        await restart()
+        await clients
+        restarted_at = time.perf_counter()
+
+        # Clients reconnect; documents recovered at startup complete without them
+        async def reconnect(doc_id: str):
+            async with semaphore:
+                async with websockets.connect(f"{ws_base}/ws/translate/{doc_id}?conn_id=bench_resume",
+                                              max_size=None) as ws:
+                    async def until_complete():
+                        async for raw in ws:
+                            if json.loads(raw).get("type") == "complete":
+                                return
+                    await asyncio.wait_for(until_complete(), args.timeout)
+
+        await asyncio.gather(*(reconnect(doc_id) for doc_id in created))
+        resume_seconds = time.perf_counter() - restarted_at
+
+        chunks = corrupted = failed = 0
+        for doc_id in created:
+            response = await client.get(f"/api/documents/{doc_id}", params={"fields": "status,chunks_data"})
+            for chunk in response.json()["chunks_data"]:
+                chunks += 1
+                if chunk.get("status") != "completed":
+                    failed += 1
+                    continue
+                # build_user_prompt ends the task text with a blank line
+                expected = mock_llm_server.reply_for(f"{chunk['raw_text']}\n\n", args.max_tokens)
+                if chunk.get("translated_text") != expected:
+                    corrupted += 1
+                    print(f"  document {created[doc_id]} chunk {chunk['chunk_index']}: translation differs "
+                          f"({len(chunk.get('translated_text') or '')} chars, expected {len(expected)})")
+
+    return {
+        "documents": len(created),
+        "resume_seconds": resume_seconds,
+        "chunks": {"total": chunks, "corrupted": corrupted, "failed": failed},
+    }
+
+
+def start_process(args: List[str], log_path: Path, env: Optional[Dict] = None) -> subprocess.Popen:
+    """Start a Python subprocess with stdout and stderr going to log_path (never a pipe nobody reads)"""
+    with open(log_path, "wb") as log:
+        return subprocess.Popen(
+            [sys.executable, *args], cwd=BACKEND_DIR, env={**os.environ, **(env or {})},
+            stdout=log, stderr=subprocess.STDOUT,
+        )
+
+
+def print_log_tail(name: str, log_path: Path, lines: int = 20):
+    if not log_path.exists():
+        return
+    tail = log_path.read_text(encoding="utf-8", errors="replace").splitlines()[-lines:]
+    if tail:
+        print(f"--- last {len(tail)} lines of {name} output ---", file=sys.stderr)
+        print("\n".join(tail), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10, help="concurrent documents in flight")
+    parser.add_argument("--documents", type=int, default=50, help="total documents to translate")
+    parser.add_argument("--doc-chars", type=int, default=20_000, help="approximate size of each document")
+    parser.add_argument("--num-chunks", type=int, default=6, help="num_chunks setting used by the backend")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-document timeout in seconds")
+    parser.add_argument("--backend-port", type=int, default=18000)
+    parser.add_argument("--mock-port", type=int, default=19100)
+    parser.add_argument("--kill-after", type=float, default=0.0,
+                        help="kill the backend after this many seconds and check the resumed documents")
+    parser.add_argument("--restart-delay", type=float, default=8.0,
+                        help="seconds the backend stays down; longer than the checkpoint stale window "
+                             "(6s) so interrupted documents are recovered at startup")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load-<rev>.json)")
+    mock_llm_server.add_arguments(parser)
+    args = parser.parse_args()
+
+    mock_args = [
+        "--port", str(args.mock_port), "--tokens-per-sec", str(args.tokens_per_sec), "--ttft", str(args.ttft),
+        "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate),
+        "--max-tokens", str(args.max_tokens), "--seed", str(args.seed),
+    ]
+    backend_url = f"http://127.0.0.1:{args.backend_port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logs = {"mock LLM server": Path(tmp) / "mock.log", "backend": Path(tmp) / "backend.log"}
+        backend_args = ["-m", "uvicorn", "main:app", "--port", str(args.backend_port), "--log-level", "warning"]
+        backend_env = {
+            "QWEN_API_KEY": "benchmark",
+            "QWEN_API_URL": f"http://127.0.0.1:{args.mock_port}/v1",
+            "MDTRANSLATOR_DB_PATH": str(Path(tmp) / "bench.db"),
+            "SHUTDOWN_DRAIN_SECONDS": "0",
+            # The mock server implements partial mode
+            "LLM_PARTIAL_RESUME": "1",
+        }
+        mock = start_process(["-m", "benchmarks.mock_llm_server", *mock_args], logs["mock LLM server"])
+        backend = start_process(backend_args, logs["backend"], env=backend_env)
+
+        async def restart():
+            nonlocal backend
+            backend.kill()
+            backend.wait()
+            await asyncio.sleep(args.restart_delay)
+            logs["restarted backend"] = Path(tmp) / "backend-restarted.log"
+            backend = start_process(backend_args, logs["restarted backend"], env=backend_env)
+            await wait_ready(f"{backend_url}/")
+
+        try:
+            asyncio.run(wait_ready(f"http://127.0.0.1:{args.mock_port}/stats"))
+            asyncio.run(wait_ready(f"{backend_url}/"))
+            print(f"Running {args.documents} documents with {args.clients} concurrent clients...")
+            if args.kill_after:
+                results = asyncio.run(kill_and_resume(args, backend_url, restart))
+            else:
+                results = asyncio.run(drive(args, backend_url, backend.pid))
+            results["mock_llm"] = httpx.get(f"http://127.0.0.1:{args.mock_port}/stats").json()
+        except BaseException:
+            for name, log_path in logs.items():
+                print_log_tail(name, log_path)
+            raise
+        finally:
+            for proc in (backend, mock):
+                proc.terminate()
+                try:
+                    proc.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+    print(json.dumps(results, indent=2))
+    params = {k: v for k, v in vars(args).items() if k not in ("output", "backend_port", "mock_port")}
+    write_results("load-restart" if args.kill_after else "load", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Micro-benchmarks for the hot paths that scale with document size:
+markdown parsing and chunking (split_into_chunks, build_document_index)
+and the per-chunk storage write (PersistentStore.update_chunk).
+
+Usage:
+    cd backend
+    python -m benchmarks.micro_bench
+    python -m benchmarks.micro_bench --sizes 100000 1000000 --repeat 5 --output before.json
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import summarize, synthetic_markdown, write_results  # noqa: E402
+from markdown_utils import md, split_into_chunks, build_document_index  # noqa: E402
+from persistent_storage import PersistentStore  # noqa: E402
+
+
+def time_sync(func: Callable, repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(samples), "min_ms": min(samples)}
+
+
+def bench_parsing(sizes: List[int], num_chunks: int, repeat: int) -> Dict:
+    results = {}
+    for size in sizes:
+        content = synthetic_markdown(size, seed=size)
+        tokens = md.parse(content)
+        chunks = split_into_chunks(content, num_chunks, tokens=tokens)
+        results[f"{size}_chars"] = {
+            "parse": time_sync(lambda: md.parse(content), repeat),
+            "split_into_chunks": time_sync(lambda: split_into_chunks(content, num_chunks, tokens=tokens), repeat),
+            "build_document_index": time_sync(lambda: build_document_index(content, chunks, tokens=tokens), repeat),
+        }
+        print(f"parsing {size:>9} chars: "
+              + ", ".join(f"{k}={v['median_ms']:.1f}ms" for k, v in results[f"{size}_chars"].items()))
+    return results
+
+
+async def bench_update_chunk(sizes: List[int], num_chunks: int, repeat: int) -> Dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PersistentStore(db_path=Path(tmp) / "micro.db")
+        for size in sizes:
+            content = synthetic_markdown(size, seed=size)
+            chunks = split_into_chunks(content, num_chunks)
+            doc_id = f"doc-{size}"
+            await store.create_document(doc_id, "micro", content, chunks)
+
+            samples = []
+            for r in range(repeat):
+                for chunk in chunks:
+                    translated = chunk["raw_text"].upper()
+                    start = time.perf_counter()
+                    await store.update_chunk(doc_id, chunk["chunk_index"], translated, "completed")
+                    samples.append((time.perf_counter() - start) * 1000)
+            stats = summarize(samples)
+            results[f"{size}_chars"] = {"update_chunk_ms": stats, "chunks": len(chunks)}
+            print(f"update_chunk {size:>9} chars / {len(chunks)} chunks: "
+                  f"p50={stats['p50']:.2f}ms p99={stats['p99']:.2f}ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000],
+                        help="document sizes in characters")
+    parser.add_argument("--num-chunks", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/micro-<rev>.json)")
+    args = parser.parse_args()
+
+    results = {
+        "parsing": bench_parsing(args.sizes, args.num_chunks, args.repeat),
+        "storage": asyncio.run(bench_update_chunk(args.sizes, args.num_chunks, args.repeat)),
+    }
+    params = {"sizes": args.sizes, "num_chunks": args.num_chunks, "repeat": args.repeat}
+    write_results("micro", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Local OpenAI-compatible streaming server for load tests.
+
+Implements POST /v1/chat/completions with SSE streaming (and a non-streamed
+fallback). Output is a deterministic pseudo-translation of the task text
+(same markdown structure, letters swapped to the other script so it passes
+the backend's translation check), emitted at a configurable rate after a configurable time-to-first-token.
+A fraction of requests can fail with 500 or be rejected with 429.
+Requests ending with a partial assistant message (Qwen partial mode, used by
+the backend with LLM_PARTIAL_RESUME=1) get only the rest of the reply.
+
+Usage:
+    cd backend
+    python -m benchmarks.mock_llm_server --port 9100 --tokens-per-sec 80 --ttft 0.3
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Rough characters per token, used to size the output from the task text
+CHARS_PER_TOKEN = 4
+TASK_MARKER = "]:\n"
+CJK_CHAR = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+LATIN_CHAR = re.compile(r"[A-Za-z]")
+
+
+class MockConfig:
+    def __init__(self, tokens_per_sec: float = 50.0, ttft: float = 0.3, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, max_tokens: int = 2000, seed: int = 0):
+        self.tokens_per_sec = tokens_per_sec
+        self.ttft = ttft
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.max_tokens = max_tokens
+        self.rng = random.Random(seed)
+
+
+def _task_text(messages: list) -> str:
+    """Extract the text to translate from the user prompt built by build_user_prompt"""
+    user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    start = user.find("[Task")
+    if start >= 0:
+        start = user.find(TASK_MARKER, start) + len(TASK_MARKER)
+        end = user.find("[Post-Context", start)
+        return user[start:end if end >= 0 else None]
+    return user
+
+
+def _pseudo_translate(text: str) -> str:
+    """Chinese source becomes Latin letters, anything else becomes CJK characters"""
+    if CJK_CHAR.search(text):
+        return CJK_CHAR.sub(lambda m: chr(ord("a") + ord(m.group(0)) % 26), text)
+    return LATIN_CHAR.sub(lambda m: chr(0x4E00 + ord(m.group(0).lower()) - ord("a")), text)
+
+
+def _tokens_for(text: str, max_tokens: int) -> list:
+    """Split text into ~CHARS_PER_TOKEN pieces, capped at max_tokens"""
+    pieces = [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+    return pieces[:max_tokens] or ["."]
+
+
+def reply_for(task_text: str, max_tokens: int) -> str:
+    """The complete reply to a task: its pseudo-translation, capped at max_tokens"""
+    return "".join(_tokens_for(_pseudo_translate(task_text), max_tokens))
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock LLM")
+    stats = {"requests": 0, "partial": 0, "rate_limited": 0, "errors": 0, "tokens": 0}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+
+        roll = config.rng.random()
+        if roll < config.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                status_code=429, headers={"retry-after-ms": "200"}
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "Injected failure", "type": "server_error"}}, status_code=500)
+
+        messages = body.get("messages", [])
+        reply = reply_for(_task_text(messages), config.max_tokens)
+        last = messages[-1] if messages else {}
+        if last.get("role") == "assistant" and last.get("partial"):
+            # Continue after the given prefix, like the real partial mode
+            stats["partial"] += 1
+            prefix = last.get("content") or ""
+            if reply.startswith(prefix):
+                reply = reply[len(prefix):]
+        pieces = _tokens_for(reply, config.max_tokens) if reply else []
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // CHARS_PER_TOKEN
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "mock")
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.ttft + len(pieces) / config.tokens_per_sec)
+            stats["tokens"] += len(pieces)
+            return {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces),
+                          "total_tokens": prompt_tokens + len(pieces)},
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def packet(delta: dict, finish_reason=None, usage=None, choices=True) -> str:
+            data = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if choices else [],
+            }
+            if usage is not None:
+                data["usage"] = usage
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(config.ttft)
+            yield packet({"role": "assistant", "content": ""})
+            interval = 1.0 / config.tokens_per_sec
+            next_at = time.perf_counter()
+            for piece in pieces:
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                stats["tokens"] += 1
+                yield packet({"content": piece})
+            yield packet({}, finish_reason="stop")
+            if include_usage:
+                yield packet({}, usage={"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces),
+                                        "total_tokens": prompt_tokens + len(pieces)}, choices=False)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="streaming rate per request")
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests rejected with 429")
+    parser.add_argument("--max-tokens", type=int, default=2000, help="cap on streamed tokens per request")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(
+        tokens_per_sec=args.tokens_per_sec, ttft=args.ttft, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, max_tokens=args.max_tokens, seed=args.seed,
+    )
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Bounded in-process LRU cache for PersistentStore reads.
+
+Each entry carries the database version it was read at (a document's
+version column, or the settings generation). Writes made by this process
+invalidate the affected entries immediately. Writes made by other workers
+sharing the database are caught by revalidation: every read makes only a
+cheap version query and reuses the entry when the version is unchanged.
+A ttl above 0 trades freshness for fewer queries: an entry is then served
+without touching SQLite for ttl seconds after it was last validated, so
+writes of other workers may stay invisible for that long.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional
+
+from metrics import CACHE_REQUESTS_TOTAL, CACHE_EVICTIONS_TOTAL
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    version: int
+    size: int
+    validated_at: float
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.monotonic() - self.validated_at < ttl
+
+
+class VersionedLRUCache:
+    """LRU of versioned entries bounded by entry count and approximate size in bytes"""
+
+    def __init__(self, name: str, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024,
+                 ttl: float = 0.0):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        # Bumped on every invalidation, see begin_read
+        self._generation = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key: Hashable) -> Optional[CacheEntry]:
+        """Return the entry for key (marking it recently used), or None"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def begin_read(self) -> int:
+        """Token to pass to put for a value about to be read from the database"""
+        return self._generation
+
+    def put(self, key: Hashable, value: Any, version: int, size: int = 0, token: Optional[int] = None):
+        """
+        Store a value read at the given version. With a token from begin_read,
+        the value is dropped if anything was invalidated while it was being
+        read, since it may predate a write made by this process.
+        """
+        if token is not None and token != self._generation:
+            return
+        self._discard(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = CacheEntry(value, version, size, time.monotonic())
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+            CACHE_EVICTIONS_TOTAL.inc(cache=self.name)
+
+    def revalidate(self, entry: CacheEntry):
+        """Mark an entry as confirmed current by a version check"""
+        entry.validated_at = time.monotonic()
+
+    def invalidate(self, key: Hashable):
+        """Drop an entry after a local write"""
+        self._generation += 1
+        self._discard(key)
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def _discard(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def record(self, result: str):
+        """Count a read as 'hit' (served from memory), 'revalidated' or 'miss'"""
+        if result == "hit":
+            self.hits += 1
+        elif result == "revalidated":
+            self.revalidated += 1
+        else:
+            self.misses += 1
+        CACHE_REQUESTS_TOTAL.inc(cache=self.name, result=result)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.revalidated + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.revalidated) / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,99 @@
+"""
+Batched checkpointing of partially streamed chunk translations.
+
+translate_chunk records the latest partial text of every in-flight chunk
+here on each token; that is a dict assignment and never touches SQLite.
+A background task flushes all dirty entries in a single transaction every
+few seconds, so a crash loses at most one interval of streamed output.
+
+Each flush also refreshes updated_at of the chunks that are still in flight
+here, even when they produced no new text (e.g. while waiting for the first
+token). Checkpoints that have not been refreshed for a few intervals belong
+to a process that is gone, which is how recovery tells them apart from
+chunks another worker is still translating.
+"""
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+
+from persistent_storage import PersistentStore, store as document_store
+
+# Seconds between two flushes of the buffer
+DEFAULT_FLUSH_INTERVAL = 2.0
+# Checkpoints not refreshed for this many intervals are considered abandoned
+STALE_AFTER_INTERVALS = 3
+
+
+class CheckpointBuffer:
+    """In-memory buffer of partial chunk texts, flushed to SQLite in batches"""
+
+    def __init__(self, store: PersistentStore, interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.store = store
+        self.interval = interval
+        # {(doc_id, chunk_index): partial_text}, only entries changed since the last flush
+        self._dirty: Dict[Tuple[str, int], str] = {}
+        # Chunks being translated by this process, refreshed on every flush
+        self._live: Set[Tuple[str, int]] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def record(self, doc_id: str, chunk_index: int, partial_text: str):
+        """Remember the latest partial text of a chunk (cheap, safe to call per token)"""
+        self._dirty[(doc_id, chunk_index)] = partial_text
+        self._live.add((doc_id, chunk_index))
+
+    def discard(self, doc_id: str, chunk_index: int):
+        """Drop a buffered checkpoint once the chunk has been persisted as final"""
+        self._dirty.pop((doc_id, chunk_index), None)
+        self._live.discard((doc_id, chunk_index))
+
+    def release(self, doc_id: str, chunk_index: int):
+        """Stop refreshing a chunk that is no longer translated here; its checkpoint is kept"""
+        self._live.discard((doc_id, chunk_index))
+
+    @property
+    def stale_after(self) -> float:
+        """Seconds after which a checkpoint that was not refreshed is considered abandoned"""
+        return self.interval * STALE_AFTER_INTERVALS
+
+    async def flush(self):
+        """Write all buffered checkpoints and refresh the in-flight ones in one transaction"""
+        async with self._flush_lock:
+            touched = [key for key in self._live if key not in self._dirty]
+            if not self._dirty and not touched:
+                return
+            batch, self._dirty = self._dirty, {}
+            try:
+                await self.store.save_checkpoints(
+                    [(doc_id, chunk_index, text) for (doc_id, chunk_index), text in batch.items()],
+                    touched=touched
+                )
+            except Exception as e:
+                # Keep the entries for the next attempt unless newer text arrived meanwhile
+                for key, text in batch.items():
+                    self._dirty.setdefault(key, text)
+                print(f"[Checkpoint] Flush failed: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        """Start the periodic flush task"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush task and write whatever is still buffered"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# Global instance
+checkpoints = CheckpointBuffer(document_store)
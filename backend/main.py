@@ -5,13 +5,14 @@ from dotenv import load_dotenv
 import os
 from pathlib import Path
 
-from routers import translate
-from routers.translate import manager, websocket_translate_handler
-
-# Load .env from parent directory
+# Load .env from parent directory, before importing modules that read settings
+# such as MDTRANSLATOR_DB_PATH at import time
 env_path = Path(__file__).resolve().parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
+from routers import translate  # noqa: E402
+from routers.translate import manager, websocket_translate_handler, startup, shutdown  # noqa: E402
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
@@ -19,9 +20,11 @@ async def lifespan(app: FastAPI):
     print(f"QWEN_API_KEY configured: {'Yes' if os.getenv('QWEN_API_KEY') else 'No'}")
     print(f"QWEN_API_URL: {os.getenv('QWEN_API_URL', 'default')}")
     print(f"QWEN_MODEL_NAME: {os.getenv('QWEN_MODEL_NAME', 'qwen-flash')}")
+    await startup()
     yield
     # Shutdown
     print("MDTranslator Backend shutting down...")
+    await shutdown()
 
 app = FastAPI(title="MDTranslator Backend", lifespan=lifespan)
 
@@ -0,0 +1,87 @@
+"""
+Periodic storage maintenance, run in the background off the request path.
+
+Each pass:
+- archives documents older than the retention_days setting (0 disables)
+  into the compressed cold-storage database
+- rewrites documents still stored uncompressed in the current format
+- returns free pages to the filesystem with an incremental VACUUM
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from persistent_storage import PersistentStore, store as document_store
+
+# Documents handled per storage call, so no single transaction holds the write lock for long
+BATCH_SIZE = 50
+# Seconds after startup before the first pass
+INITIAL_DELAY = 60.0
+
+
+class MaintenanceTask:
+    """Background loop running run_once every interval seconds"""
+
+    def __init__(self, store: PersistentStore):
+        self.store = store
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> Dict[str, int]:
+        """Run one maintenance pass and return what it did"""
+        settings = await self.store.get_all_settings()
+        retention_days = float(settings.get("retention_days") or 0)
+
+        archived = 0
+        if retention_days > 0:
+            cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+            while True:
+                count = await self.store.archive_documents(cutoff, limit=BATCH_SIZE)
+                archived += count
+                if count < BATCH_SIZE:
+                    break
+                await asyncio.sleep(0)
+
+        compressed = 0
+        while True:
+            count = await self.store.compress_documents(limit=BATCH_SIZE)
+            compressed += count
+            if count < BATCH_SIZE:
+                break
+            await asyncio.sleep(0)
+
+        freed_pages = await self.store.incremental_vacuum()
+
+        result = {"archived": archived, "compressed": compressed, "freed_pages": freed_pages}
+        if any(result.values()):
+            print(f"[Maintenance] {result}")
+        return result
+
+    async def _run(self, interval: float):
+        await asyncio.sleep(INITIAL_DELAY)
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"[Maintenance] Error: {type(e).__name__}: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self):
+        """Start the loop; the interval comes from MAINTENANCE_INTERVAL_SECONDS (default 1 hour)"""
+        interval = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "3600"))
+        if interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        """Stop the loop (an interrupted pass leaves storage consistent)"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global instance
+maintenance = MaintenanceTask(document_store)
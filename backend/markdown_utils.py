@@ -1,9 +1,12 @@
+import re
+from difflib import SequenceMatcher
 from markdown_it import MarkdownIt
-from typing import List, Dict
+from markdown_it.token import Token
+from typing import List, Dict, Optional, Set
 
 md = MarkdownIt("commonmark")
 
-def split_into_chunks(content: str, num_chunks: int = 3) -> List[Dict]:
+def split_into_chunks(content: str, num_chunks: int = 3, tokens: Optional[List[Token]] = None) -> List[Dict]:
     """
     Splits markdown content into N chunks based on document structure.
     Tries to split at header boundaries (H1/H2) to maintain document coherence.
@@ -11,6 +14,7 @@ def split_into_chunks(content: str, num_chunks: int = 3) -> List[Dict]:
     Args:
         content: The markdown content to split
         num_chunks: Number of chunks to split into (default: 3)
+        tokens: Pre-parsed token stream of content (parsed here if omitted)
     
     Returns:
         List of chunk dictionaries
@@ -21,7 +25,8 @@ def split_into_chunks(content: str, num_chunks: int = 3) -> List[Dict]:
     # Ensure num_chunks is at least 1
     num_chunks = max(1, num_chunks)
     
-    tokens = md.parse(content)
+    if tokens is None:
+        tokens = md.parse(content)
     lines = content.splitlines(keepends=True)
     total_lines = len(lines)
     
@@ -104,3 +109,272 @@ def split_into_chunks(content: str, num_chunks: int = 3) -> List[Dict]:
     
     return chunks
 
+
+
+def _slugify(text: str) -> str:
+    """GitHub-style heading anchor: lowercase, punctuation stripped, spaces to hyphens"""
+    slug = re.sub(r"[^\w\- ]", "", text.strip().lower())
+    return slug.replace(" ", "-") or "section"
+
+def build_document_index(content: str, chunks: List[Dict], tokens: Optional[List[Token]] = None) -> Dict:
+    """
+    Builds the structural index of a document from its token stream.
+    
+    Args:
+        content: The markdown content
+        chunks: Chunks produced by split_into_chunks for the same content
+        tokens: Pre-parsed token stream of content (parsed here if omitted)
+    
+    Returns:
+        Dictionary with:
+        - total_lines: number of source lines
+        - headings: flat heading tree, each with id, level, text, start/end line
+          of its section, parent heading id and the chunk it starts in
+        - blocks: top-level blocks as [start_line, end_line, type]
+        - chunks: per chunk, the innermost section it starts in and the
+          ids of headings that start inside it
+    """
+    if tokens is None:
+        tokens = md.parse(content)
+    total_lines = len(content.splitlines())
+    
+    def chunk_at(line: int) -> Optional[int]:
+        for chunk in chunks:
+            if chunk["start_line"] <= line < chunk["end_line"]:
+                return chunk["chunk_index"]
+        return None
+    
+    headings: List[Dict] = []
+    blocks: List[list] = []
+    used_ids: Dict[str, int] = {}  # next suffix per slug
+    taken_ids: Set[str] = set()
+    stack: List[Dict] = []  # open sections, outermost first
+    
+    for i, token in enumerate(tokens):
+        if token.level != 0 or not token.map or token.nesting == -1:
+            continue
+        start, end = token.map
+        block_type = token.type[:-5] if token.type.endswith("_open") else token.type
+        blocks.append([start, end, block_type])
+        
+        if token.type != "heading_open":
+            continue
+        level = int(token.tag[1])
+        text = tokens[i + 1].content if i + 1 < len(tokens) and tokens[i + 1].type == "inline" else ""
+        
+        # Suffix repeated slugs, skipping ids already taken by a heading whose own slug looks suffixed
+        slug = _slugify(text)
+        count = used_ids.get(slug, 0)
+        heading_id = slug if count == 0 else f"{slug}-{count}"
+        while heading_id in taken_ids:
+            count += 1
+            heading_id = f"{slug}-{count}"
+        used_ids[slug] = count + 1
+        taken_ids.add(heading_id)
+        
+        # A heading closes every open section of the same or deeper level
+        while stack and stack[-1]["level"] >= level:
+            stack.pop()["end_line"] = start
+        heading = {
+            "id": heading_id,
+            "level": level,
+            "text": text,
+            "start_line": start,
+            "end_line": total_lines,
+            "parent": stack[-1]["id"] if stack else None,
+            "chunk_index": chunk_at(start),
+        }
+        headings.append(heading)
+        stack.append(heading)
+    
+    chunk_entries = []
+    for chunk in chunks:
+        section = None
+        inside = []
+        for heading in headings:
+            if heading["start_line"] <= chunk["start_line"] < heading["end_line"]:
+                section = heading["id"]  # later (deeper) matches win
+            if chunk["start_line"] <= heading["start_line"] < chunk["end_line"]:
+                inside.append(heading["id"])
+        chunk_entries.append({
+            "chunk_index": chunk["chunk_index"],
+            "section": section,
+            "headings": inside,
+        })
+    
+    return {
+        "total_lines": total_lines,
+        "headings": headings,
+        "blocks": blocks,
+        "chunks": chunk_entries,
+    }
+
+
+# Parser for translation checks: tables are not part of CommonMark but must survive translation
+validation_md = MarkdownIt("commonmark").enable("table")
+
+_CJK_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+_LATIN_RE = re.compile(r"[A-Za-z]")
+# Below this many letters of prose the language check is skipped (code-only chunks, short labels)
+MIN_LETTERS_FOR_LANGUAGE_CHECK = 20
+
+def structure_signature(text: str) -> Dict:
+    """
+    Summarizes the markdown structure of text for comparison with its translation.
+    
+    Returns:
+        Dictionary with heading levels in order, code fence count, table shapes
+        as [rows, columns], link and image counts, and the counts of CJK and
+        Latin letters in prose (code and URLs excluded)
+    """
+    tokens = validation_md.parse(text)
+    signature = {"headings": [], "fences": 0, "tables": [], "links": 0, "images": 0, "cjk": 0, "latin": 0}
+    table = None
+    
+    for token in tokens:
+        if token.type == "heading_open":
+            signature["headings"].append(int(token.tag[1]))
+        elif token.type in ("fence", "code_block"):
+            signature["fences"] += 1
+        elif token.type == "table_open":
+            table = [0, 0]
+        elif token.type == "tr_open" and table is not None:
+            table[0] += 1
+            table[1] = 0
+        elif token.type in ("th_open", "td_open") and table is not None:
+            table[1] += 1
+        elif token.type == "table_close" and table is not None:
+            signature["tables"].append(table)
+            table = None
+        elif token.type == "inline":
+            for child in token.children or []:
+                if child.type == "link_open":
+                    signature["links"] += 1
+                elif child.type == "image":
+                    signature["images"] += 1
+                if child.type == "text" or child.type == "image":
+                    prose = child.content
+                    signature["cjk"] += len(_CJK_RE.findall(prose))
+                    signature["latin"] += len(_LATIN_RE.findall(prose))
+    
+    return signature
+
+def _table_shapes(tables: List[list]) -> str:
+    return ", ".join(f"{rows}x{cols}" for rows, cols in tables) or "none"
+
+def validate_translation(source: str, translated: str, direction: str = "en2zh") -> List[str]:
+    """
+    Checks that a translated chunk kept the markdown structure of its source
+    and is written in the target language.
+    
+    Args:
+        source: The source markdown
+        translated: The model output for it
+        direction: "en2zh" or "zh2en"
+    
+    Returns:
+        Human-readable descriptions of the problems found, empty when the translation passes
+    """
+    if source.strip() and not translated.strip():
+        return ["translation is empty"]
+    
+    expected = structure_signature(source)
+    actual = structure_signature(translated)
+    issues = []
+    
+    if expected["headings"] != actual["headings"]:
+        issues.append(f"heading levels {actual['headings']} do not match source {expected['headings']}")
+    if expected["fences"] != actual["fences"]:
+        issues.append(f"{actual['fences']} code blocks instead of {expected['fences']}")
+    if expected["tables"] != actual["tables"]:
+        issues.append(
+            f"table shapes ({_table_shapes(actual['tables'])}) do not match source ({_table_shapes(expected['tables'])})"
+        )
+    if expected["links"] != actual["links"]:
+        issues.append(f"{actual['links']} links instead of {expected['links']}")
+    if expected["images"] != actual["images"]:
+        issues.append(f"{actual['images']} images instead of {expected['images']}")
+    
+    letters = actual["cjk"] + actual["latin"]
+    if letters >= MIN_LETTERS_FOR_LANGUAGE_CHECK:
+        cjk_ratio = actual["cjk"] / letters
+        # Latin letters outnumber CJK characters for the same content, and
+        # Chinese technical text keeps English terms, hence the low bar for zh
+        if direction == "en2zh" and cjk_ratio < 0.15:
+            issues.append("output is not in Chinese")
+        elif direction == "zh2en" and cjk_ratio > 0.05:
+            issues.append("output still contains Chinese text")
+    
+    return issues
+
+def _alignment_blocks(text: str) -> List[tuple]:
+    """Top-level blocks of text as (start_line, end_line, kind); headings keep their level"""
+    blocks = []
+    for token in validation_md.parse(text):
+        if token.level != 0 or not token.map or token.nesting == -1:
+            continue
+        kind = token.tag if token.type == "heading_open" else token.type.replace("_open", "")
+        blocks.append((token.map[0], token.map[1], kind))
+    return blocks
+
+def align_blocks(source: str, translated: str) -> List[List[int]]:
+    """
+    Pairs the top-level blocks (paragraphs, headings, lists, tables, code...)
+    of a source chunk with their counterparts in its translation.
+    
+    Blocks are matched in order by kind; a run of blocks that differ between
+    the two sides becomes one pair covering all of them, and a block with no
+    counterpart is paired with an empty range, so the result covers both
+    texts and is monotonic on both sides.
+    
+    Returns:
+        [source_start, source_end, translated_start, translated_end] line
+        ranges (end exclusive), relative to the start of each text
+    """
+    src = _alignment_blocks(source)
+    out = _alignment_blocks(translated)
+    out_total = len(translated.splitlines())
+    matcher = SequenceMatcher(None, [b[2] for b in src], [b[2] for b in out], autojunk=False)
+    
+    pairs: List[List[int]] = []
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            pairs.extend([src[i][0], src[i][1], out[j][0], out[j][1]] for i, j in zip(range(i1, i2), range(j1, j2)))
+            continue
+        if i1 < i2:
+            src_start, src_end = src[i1][0], src[i2 - 1][1]
+        else:
+            src_start = src_end = src[i1][0] if i1 < len(src) else (src[-1][1] if src else 0)
+        if j1 < j2:
+            out_start, out_end = out[j1][0], out[j2 - 1][1]
+        else:
+            out_start = out_end = out[j1][0] if j1 < len(out) else (out[-1][1] if out else out_total)
+        pairs.append([src_start, src_end, out_start, out_end])
+    return pairs
+
+def document_alignment(chunks: List[Dict]) -> List[int]:
+    """
+    Flattens the stored alignment of each completed chunk (see align_blocks)
+    into document line numbers: [source_start, source_end, translated_start,
+    translated_end, ...].
+    
+    Translations are concatenated without separators, so a chunk whose
+    translation does not end with a newline shares its last line with the
+    next chunk. Each chunk's ranges are clamped to where the next chunk
+    starts, which keeps both start columns non-decreasing.
+    """
+    blocks: List[int] = []
+    translated_line = 0  # start line of the current chunk in the concatenated translation
+    for chunk in sorted(chunks, key=lambda c: c.get("chunk_index", 0)):
+        translated_text = chunk.get("translated_text") or ""
+        translated_next = translated_line + translated_text.count("\n")
+        if chunk.get("status") == "completed" and chunk.get("alignment"):
+            source_line = chunk.get("start_line", 0)
+            source_next = chunk.get("end_line", source_line + (chunk.get("raw_text") or "").count("\n"))
+            for src_start, src_end, out_start, out_end in chunk["alignment"]:
+                blocks.extend((
+                    min(source_line + src_start, source_next), min(source_line + src_end, source_next),
+                    min(translated_line + out_start, translated_next), min(translated_line + out_end, translated_next),
+                ))
+        translated_line = translated_next
+    return blocks
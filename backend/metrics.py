@@ -0,0 +1,191 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+All metrics are updated from the event loop thread, so recording a sample
+is a dict lookup and a few additions with no locking. Label values are
+passed as keyword arguments and must always use the same label names.
+"""
+import bisect
+import functools
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds (Prometheus client defaults)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets for whole chunks / documents, which take seconds to minutes
+LONG_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing value"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> List[str]:
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in self._values.items()]
+
+
+class Gauge:
+    """Value that can go up and down, or is computed at scrape time by a callback"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[_label_key(labels)] = value
+
+    def collect(self) -> List[str]:
+        if self.callback is not None:
+            return [f"{self.name} {_format_value(self.callback())}"]
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in self._values.items()]
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # {labels: [bucket counts..., +Inf count, sum]}
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def time(self, **labels):
+        """Decorator for coroutine functions: observe their wall-clock duration"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def collect(self) -> List[str]:
+        lines = []
+        for key, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together on /metrics"""
+
+    def __init__(self):
+        self._metrics: List = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- LLM streaming ---
+LLM_TTFT_SECONDS = registry.register(Histogram(
+    "mdt_llm_time_to_first_token_seconds", "Time from request to first streamed token"))
+LLM_TOKENS_PER_SECOND = registry.register(Histogram(
+    "mdt_llm_tokens_per_second", "Completion tokens per second of a streamed request after the first token",
+    buckets=(5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500)))
+LLM_TOKENS_TOTAL = registry.register(Counter(
+    "mdt_llm_tokens_total", "LLM tokens consumed, by direction and kind (prompt/completion)"))
+LLM_COST_TOTAL = registry.register(Counter(
+    "mdt_llm_cost_total", "Estimated LLM spend, by direction"))
+UPSTREAM_ERRORS_TOTAL = registry.register(Counter(
+    "mdt_upstream_errors_total", "Failed LLM requests, by exception type"))
+
+# --- Translation pipeline ---
+CHUNK_LATENCY_SECONDS = registry.register(Histogram(
+    "mdt_chunk_latency_seconds", "End-to-end chunk translation latency, by final status",
+    buckets=LONG_BUCKETS))
+DOCUMENT_LATENCY_SECONDS = registry.register(Histogram(
+    "mdt_document_latency_seconds", "Latency of a translation session from start to completion",
+    buckets=LONG_BUCKETS))
+QUEUE_WAIT_SECONDS = registry.register(Histogram(
+    "mdt_scheduler_queue_wait_seconds", "Time a chunk waits for a session concurrency slot",
+    buckets=DEFAULT_BUCKETS + (30.0, 60.0, 120.0)))
+VALIDATION_FAILURES_TOTAL = registry.register(Counter(
+    "mdt_validation_failures_total", "Translated chunks failing the structural check, by direction"))
+VALIDATION_RETRIES_TOTAL = registry.register(Counter(
+    "mdt_validation_retries_total", "Chunks re-translated with a stricter prompt after a failed check, by direction"))
+CHUNK_ERRORS_TOTAL = registry.register(Counter(
+    "mdt_chunk_errors_total", "Chunks failed for reasons other than the LLM request (e.g. storage), by exception type"))
+
+# --- Storage ---
+SQLITE_OPERATION_SECONDS = registry.register(Histogram(
+    "mdt_sqlite_operation_seconds", "Latency of PersistentStore operations, by method"))
+
+CACHE_REQUESTS_TOTAL = registry.register(Counter(
+    "mdt_cache_requests_total", "PersistentStore cache reads, by cache and result (hit/revalidated/miss)"))
+CACHE_EVICTIONS_TOTAL = registry.register(Counter(
+    "mdt_cache_evictions_total", "Entries evicted from PersistentStore caches, by cache"))
+
+# --- WebSocket ---
+WS_SEND_SECONDS = registry.register(Histogram(
+    "mdt_websocket_send_seconds", "Latency of a single WebSocket send"))
+WS_SENT_BYTES_TOTAL = registry.register(Counter(
+    "mdt_websocket_sent_bytes_total", "Bytes sent over WebSocket connections"))
+WS_MESSAGES_TOTAL = registry.register(Counter(
+    "mdt_websocket_messages_total", "Messages sent over WebSocket connections"))
@@ -2,16 +2,25 @@
 SQLite-based persistent storage for documents and settings.
 Uses aiosqlite for async operations.
 """
+import asyncio
+import html
 import json
+import os
+import re
+import zlib
 import aiosqlite
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Union
 from datetime import datetime
 from pathlib import Path
 
+from cache import VersionedLRUCache
+from metrics import SQLITE_OPERATION_SECONDS
+
 # Database file path
 DATA_DIR = Path(__file__).resolve().parent / "data"
 DATA_DIR.mkdir(exist_ok=True)
-DB_PATH = DATA_DIR / "mdtranslator.db"
+# MDTRANSLATOR_DB_PATH points the app at another database (e.g. for benchmarks)
+DB_PATH = Path(os.getenv("MDTRANSLATOR_DB_PATH") or DATA_DIR / "mdtranslator.db")
 
 # SQL statements
 CREATE_DOCUMENTS_TABLE = """
@@ -23,9 +32,83 @@ CREATE TABLE IF NOT EXISTS documents (
     chunks_data TEXT DEFAULT '[]',
     status TEXT DEFAULT 'pending',
     created_at TEXT,
-    updated_at TEXT
+    updated_at TEXT,
+    version INTEGER DEFAULT 0,
+    structure_index TEXT,
+    direction TEXT DEFAULT 'en2zh',
+    content_format INTEGER DEFAULT 0,
+    content_hash TEXT
+)
+"""
+
+# Columns added after the first release, applied to existing databases on startup
+DOCUMENT_MIGRATIONS = {
+    "version": "ALTER TABLE documents ADD COLUMN version INTEGER DEFAULT 0",
+    "structure_index": "ALTER TABLE documents ADD COLUMN structure_index TEXT",
+    "direction": "ALTER TABLE documents ADD COLUMN direction TEXT DEFAULT 'en2zh'",
+    "content_format": "ALTER TABLE documents ADD COLUMN content_format INTEGER DEFAULT 0",
+    "content_hash": "ALTER TABLE documents ADD COLUMN content_hash TEXT",
+}
+
+# Storage format of the large text columns, recorded per row in content_format.
+# In FORMAT_ZLIB rows, values of COMPRESSED_COLUMNS may be zlib-compressed
+# UTF-8 BLOBs; values below COMPRESSION_MIN_BYTES stay plain TEXT.
+FORMAT_PLAIN = 0
+FORMAT_ZLIB = 1
+CURRENT_FORMAT = FORMAT_ZLIB
+COMPRESSED_COLUMNS = ("original_content", "translated_content", "chunks_data", "structure_index")
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_LEVEL = 6
+# Encoding or decoding more than this many bytes runs in a worker thread
+OFFLOAD_MIN_BYTES = 256 * 1024
+
+# Cold storage for documents past the retention period: a separate database
+# file (attached on demand) holding each document as one zlib-compressed JSON blob
+ARCHIVE_COMPRESSION_LEVEL = 9
+CREATE_ARCHIVE_TABLE = """
+CREATE TABLE IF NOT EXISTS archive.archived_documents (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    status TEXT,
+    direction TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    archived_at TEXT,
+    payload BLOB
 )
 """
+# Databases created before incremental auto-vacuum are converted with a
+# one-off VACUUM when first opened (at startup, before requests are served),
+# only when small enough for that not to delay startup for long
+VACUUM_CONVERT_MAX_BYTES = 256 * 1024 * 1024
+
+# Several workers can start on the same database at once: schema setup waits
+# this long for another worker's migration or index backfill to finish
+INIT_BUSY_TIMEOUT_MS = 120_000
+
+# Fields that can be requested from get_document (SQL expression per field)
+DOCUMENT_FIELDS = {
+    "id": "id",
+    "title": "title",
+    "original_content": "original_content",
+    "translated_content": "translated_content",
+    "chunks_data": "chunks_data",
+    "status": "status",
+    "direction": "direction",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "version": "version",
+    "is_translated": "length(translated_content) > 0",
+    "structure_index": "structure_index",
+}
+
+# The structure index is served by its own endpoints, so it is only
+# returned from get_document when explicitly requested
+DEFAULT_DOCUMENT_FIELDS = [f for f in DOCUMENT_FIELDS if f != "structure_index"]
+# The whole-document text fields are never cached; everything else can be served
+# from the document cache. That includes chunks_data, which holds the source and
+# translated text of every chunk: its size counts toward the cache's max_bytes
+UNCACHED_DOCUMENT_FIELDS = ("original_content", "translated_content")
 
 CREATE_SETTINGS_TABLE = """
 CREATE TABLE IF NOT EXISTS settings (
@@ -34,91 +117,482 @@ CREATE TABLE IF NOT EXISTS settings (
 )
 """
 
+# Change counters for data that has no version column of its own (currently
+# only 'settings'), so caches in other workers can tell when it changed
+CREATE_STORE_VERSIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS store_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+BUMP_SETTINGS_VERSION = """
+INSERT INTO store_versions (name, version) VALUES ('settings', 1)
+ON CONFLICT(name) DO UPDATE SET version = version + 1
+"""
+
 CREATE_INDEX = """
 CREATE INDEX IF NOT EXISTS idx_documents_updated_at ON documents(updated_at DESC)
 """
 
+CREATE_CONTENT_HASH_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash)
+"""
+
+# Partial output of chunks that were still streaming, see checkpoint.py
+CREATE_CHECKPOINTS_TABLE = """
+CREATE TABLE IF NOT EXISTS chunk_checkpoints (
+    doc_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    partial_text TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (doc_id, chunk_index)
+)
+"""
+
+# Token usage and estimated cost per document, direction and model. Rows are
+# kept when a document is deleted so past spend stays attributable.
+CREATE_USAGE_TABLE = """
+CREATE TABLE IF NOT EXISTS document_usage (
+    doc_id TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    cost REAL DEFAULT 0,
+    requests INTEGER DEFAULT 0,
+    updated_at TEXT,
+    PRIMARY KEY (doc_id, direction, model)
+)
+"""
+
+# Full-text search: one row per chunk. search_chunks maps (doc_id, chunk_index)
+# to the rowid of the FTS5 row so single chunks can be updated without a scan.
+CREATE_SEARCH_CHUNKS_TABLE = """
+CREATE TABLE IF NOT EXISTS search_chunks (
+    rowid INTEGER PRIMARY KEY,
+    doc_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    UNIQUE (doc_id, chunk_index)
+)
+"""
+
+# The trigram tokenizer indexes every 3-character window, which makes
+# substring search work for Chinese text that has no word separators.
+# Two-character terms (most Chinese words) are shorter than a trigram, so
+# cjk_bigrams holds every distinct CJK bigram of the chunk followed by a
+# space: the trigram "具身 " is then present exactly when "具身" occurs.
+# The table is contentless: it stores only the index, and the text (kept
+# compressed in documents) is read back from there for snippets. Rows are
+# removed with the 'delete' command, which needs the exact indexed values.
+CREATE_SEARCH_FTS_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+    title, raw_text, translated_text, cjk_bigrams,
+    content = '',
+    tokenize = '{tokenizer}'
+)
+"""
+
+INSERT_SEARCH_ROW = """
+INSERT INTO search_fts (rowid, title, raw_text, translated_text, cjk_bigrams)
+SELECT rowid, ?, ?, ?, ? FROM search_chunks WHERE doc_id = ? AND chunk_index = ?
+"""
+
+DELETE_SEARCH_ROW = """
+INSERT INTO search_fts (search_fts, rowid, title, raw_text, translated_text, cjk_bigrams)
+SELECT 'delete', rowid, ?, ?, ?, ? FROM search_chunks WHERE doc_id = ? AND chunk_index = ?
+"""
+
+SEARCH_TEXT_COLUMNS = "{title raw_text translated_text}"
+
+SEARCH_TOKENIZER = "trigram"
+FALLBACK_SEARCH_TOKENIZER = "unicode61"
+
+# Trigram queries need at least this many characters per term
+MIN_MATCH_TERM_LENGTH = 3
+# Index rows / documents read per step while filtering search results
+SEARCH_BATCH_SIZE = 100
+# Documents read by the unindexed scan (terms of one character or short non-CJK terms)
+SEARCH_SCAN_MAX_DOCUMENTS = 2000
+
+CJK_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]{2,}")
+CJK_BIGRAM = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]{2}")
+
+
+def _encode(text: Optional[str]) -> Union[str, bytes, None]:
+    """Compress a column value for storage (small values are kept as TEXT)"""
+    if text is None:
+        return None
+    data = text.encode("utf-8")
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return text
+    return zlib.compress(data, COMPRESSION_LEVEL)
+
+
+def _decode(value: Union[str, bytes, None], content_format: Optional[int]) -> Optional[str]:
+    """Inverse of _encode for a row stored in the given content_format"""
+    if not isinstance(value, bytes):
+        return value
+    if content_format == FORMAT_ZLIB:
+        return zlib.decompress(value).decode("utf-8")
+    raise ValueError(f"Unknown content format {content_format}")
+
+
+async def _encode_async(*texts: Optional[str]) -> List[Union[str, bytes, None]]:
+    """_encode several values, off the event loop when they are large"""
+    if sum(len(t) for t in texts if t) >= OFFLOAD_MIN_BYTES:
+        return await asyncio.to_thread(lambda: [_encode(t) for t in texts])
+    return [_encode(t) for t in texts]
+
+
+async def _decode_async(content_format: Optional[int], *values: Union[str, bytes, None]) -> List[Optional[str]]:
+    """_decode several values, off the event loop when they are large"""
+    if sum(len(v) for v in values if isinstance(v, bytes)) * 4 >= OFFLOAD_MIN_BYTES:
+        return await asyncio.to_thread(lambda: [_decode(v, content_format) for v in values])
+    return [_decode(v, content_format) for v in values]
+
+
+def _join_translations(chunks: list) -> str:
+    """Translated content of a document: translated chunks concatenated in order"""
+    sorted_chunks = sorted(chunks, key=lambda x: x.get("chunk_index", 0))
+    return "".join(c.get("translated_text", "") for c in sorted_chunks if c.get("translated_text"))
+
+
+def _timed(func):
+    """Record the latency of a PersistentStore method under its name"""
+    return SQLITE_OPERATION_SECONDS.time(method=func.__name__)(func)
+
+
+class DocumentExistsError(Exception):
+    """An archived document cannot be restored because its id is in use again"""
+
 
 class PersistentStore:
     """Async SQLite storage interface"""
     
-    def __init__(self):
+    def __init__(self, db_path: Path = DB_PATH):
+        self.db_path = db_path
+        self.archive_path = db_path.with_name(f"{db_path.stem}_archive{db_path.suffix}")
         self._initialized = False
+        self.search_tokenizer = SEARCH_TOKENIZER
+        self._settings_cache = VersionedLRUCache("settings", max_entries=1)
+        self._document_cache = VersionedLRUCache("documents")
+    
+    def configure_cache(self):
+        """
+        Apply cache settings from the environment (called at startup, after .env is loaded):
+        CACHE_TTL_SECONDS  seconds an entry is trusted before its version is rechecked (default 0 = always)
+        CACHE_MAX_DOCUMENTS  documents kept in the cache (default 256, 0 disables it)
+        """
+        ttl = float(os.getenv("CACHE_TTL_SECONDS", "0"))
+        self._settings_cache.ttl = ttl
+        self._document_cache.ttl = ttl
+        self._document_cache.max_entries = int(os.getenv("CACHE_MAX_DOCUMENTS", "256"))
+        self._document_cache.clear()
+    
+    def cache_stats(self) -> Dict[str, Dict]:
+        """Hit rates and sizes of the in-process caches"""
+        return {
+            "settings": self._settings_cache.stats(),
+            "documents": self._document_cache.stats(),
+        }
     
     def _get_connection(self):
         """Get database connection context manager"""
-        return aiosqlite.connect(DB_PATH)
+        return aiosqlite.connect(self.db_path)
     
     async def _ensure_initialized(self, conn: aiosqlite.Connection):
-        """Ensure tables exist (called once per app lifecycle)"""
+        """
+        Ensure tables exist (called once per app lifecycle). Migrations and the
+        search index backfill run in one write transaction, so workers starting
+        together apply them once; every check is made inside the transaction.
+        """
         if not self._initialized:
             conn.row_factory = aiosqlite.Row
+            await conn.execute(f"PRAGMA busy_timeout = {INIT_BUSY_TIMEOUT_MS}")
+            # Runs first: VACUUM is not allowed inside the transaction opened below
+            await self._enable_incremental_vacuum(conn)
+            await conn.execute("BEGIN IMMEDIATE")
             await conn.execute(CREATE_DOCUMENTS_TABLE)
             await conn.execute(CREATE_SETTINGS_TABLE)
+            await conn.execute(CREATE_STORE_VERSIONS_TABLE)
+            await self._migrate_documents_table(conn)
             await conn.execute(CREATE_INDEX)
+            await conn.execute(CREATE_CONTENT_HASH_INDEX)
+            await conn.execute(CREATE_CHECKPOINTS_TABLE)
+            await conn.execute(CREATE_USAGE_TABLE)
+            await self._init_search_index(conn)
             await conn.commit()
+            await conn.execute("PRAGMA busy_timeout = 5000")
             self._initialized = True
-            print(f"[Storage] SQLite database initialized at {DB_PATH}")
+            print(f"[Storage] SQLite database initialized at {self.db_path}")
+    
+    async def _enable_incremental_vacuum(self, conn: aiosqlite.Connection):
+        """
+        Switch the database to auto_vacuum=INCREMENTAL. A new database only needs
+        the pragma; an existing one is rewritten with VACUUM if it is small enough
+        """
+        await conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor = await conn.execute("PRAGMA auto_vacuum")
+        if (await cursor.fetchone())[0] == 2:
+            return
+        manual = "run 'PRAGMA auto_vacuum = INCREMENTAL; VACUUM;' during downtime to enable it"
+        if self.db_path.stat().st_size > VACUUM_CONVERT_MAX_BYTES:
+            print(f"[Storage] {self.db_path.name} has no incremental auto-vacuum; {manual}")
+            return
+        try:
+            await conn.execute("VACUUM")
+            print(f"[Storage] Converted {self.db_path.name} to incremental auto-vacuum")
+        except aiosqlite.OperationalError as e:
+            # e.g. another worker holds the database while starting up
+            print(f"[Storage] Could not convert {self.db_path.name} to incremental auto-vacuum ({e}); {manual}")
     
-    async def create_document(self, doc_id: str, title: str, original_content: str, chunks_data: list) -> Dict:
-        """Create a new document"""
+    async def _migrate_documents_table(self, conn: aiosqlite.Connection):
+        """Add columns that are missing from databases created by older versions"""
+        cursor = await conn.execute("PRAGMA table_info(documents)")
+        existing = {row[1] for row in await cursor.fetchall()}
+        for column, statement in DOCUMENT_MIGRATIONS.items():
+            if column not in existing:
+                try:
+                    await conn.execute(statement)
+                except aiosqlite.OperationalError as e:
+                    # Added by another process that did not wait for our transaction
+                    if "duplicate column" not in str(e):
+                        raise
+                    continue
+                print(f"[Storage] Migrated documents table: added column '{column}'")
+    
+    async def _init_search_index(self, conn: aiosqlite.Connection):
+        """Create the FTS5 search tables and backfill them from existing documents"""
+        await conn.execute(CREATE_SEARCH_CHUNKS_TABLE)
+        cursor = await conn.execute("SELECT sql FROM sqlite_master WHERE name = 'search_fts'")
+        row = await cursor.fetchone()
+        if row and "cjk_bigrams" not in row[0]:
+            # Older versions stored a copy of every chunk and had no bigram column
+            await conn.execute("DROP TABLE search_fts")
+            await conn.execute("DELETE FROM search_chunks")
+            print("[Storage] Rebuilding search index")
+        try:
+            await conn.execute(CREATE_SEARCH_FTS_TABLE.format(tokenizer=SEARCH_TOKENIZER))
+        except aiosqlite.OperationalError:
+            # SQLite < 3.34 has no trigram tokenizer
+            self.search_tokenizer = FALLBACK_SEARCH_TOKENIZER
+            await conn.execute(CREATE_SEARCH_FTS_TABLE.format(tokenizer=FALLBACK_SEARCH_TOKENIZER))
+            print("[Storage] trigram tokenizer unavailable, CJK search will be word-based")
+        
+        cursor = await conn.execute("SELECT 1 FROM search_chunks LIMIT 1")
+        if await cursor.fetchone():
+            return
+        
+        cursor = await conn.execute("SELECT id, title, chunks_data, content_format FROM documents")
+        rows = await cursor.fetchall()
+        for row in rows:
+            chunks = json.loads(_decode(row["chunks_data"], row["content_format"]) or "[]")
+            await self._index_chunks(conn, row["id"], row["title"], chunks)
+        if rows:
+            print(f"[Storage] Search index built for {len(rows)} documents")
+    
+    async def _index_chunks(self, conn: aiosqlite.Connection, doc_id: str, title: str, chunks: list):
+        """Add all chunks of a document to the search index (chunks already indexed are skipped)"""
+        for chunk in chunks:
+            cursor = await conn.execute(
+                "INSERT OR IGNORE INTO search_chunks (doc_id, chunk_index) VALUES (?, ?)",
+                (doc_id, chunk.get("chunk_index", 0))
+            )
+            if not cursor.rowcount:
+                continue
+            await conn.execute(
+                """INSERT INTO search_fts (rowid, title, raw_text, translated_text, cjk_bigrams)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (cursor.lastrowid, *_search_columns(title, chunk))
+            )
+    
+    async def _unindex_chunks(self, conn: aiosqlite.Connection, doc_id: str, title: str, chunks: list):
+        """Remove chunks from the search index, given the values they were indexed with"""
+        await conn.executemany(
+            DELETE_SEARCH_ROW,
+            [(*_search_columns(title, c), doc_id, c.get("chunk_index", 0)) for c in chunks]
+        )
+    
+    @_timed
+    async def create_document(self, doc_id: str, title: str, original_content: str, chunks_data: list,
+                              structure_index: Optional[Dict] = None, direction: str = "en2zh",
+                              content_hash: Optional[str] = None) -> Dict:
+        """
+        Create a new document.
+        chunks_data may already contain completed chunks (e.g. copied from a
+        duplicate); the document is created as completed when all of them are.
+        """
         now = datetime.now().isoformat()
+        translated_content = _join_translations(chunks_data)
+        status = "completed" if chunks_data and all(c.get("status") == "completed" for c in chunks_data) else "processing"
         chunks_json = json.dumps(chunks_data, ensure_ascii=False)
+        index_json = json.dumps(structure_index, ensure_ascii=False) if structure_index is not None else None
+        content_value, translated_value, chunks_value, index_value = await _encode_async(
+            original_content, translated_content, chunks_json, index_json
+        )
         
         async with self._get_connection() as conn:
             conn.row_factory = aiosqlite.Row
             await self._ensure_initialized(conn)
             await conn.execute(
-                """INSERT INTO documents (id, title, original_content, translated_content, chunks_data, status, created_at, updated_at)
-                   VALUES (?, ?, ?, '', ?, 'processing', ?, ?)""",
-                (doc_id, title, original_content, chunks_json, now, now)
+                """INSERT INTO documents (id, title, original_content, translated_content, chunks_data, status,
+                                         created_at, updated_at, structure_index, direction, content_format,
+                                         content_hash)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (doc_id, title, content_value, translated_value, chunks_value, status, now, now, index_value,
+                 direction, CURRENT_FORMAT, content_hash)
             )
+            await self._index_chunks(conn, doc_id, title, chunks_data)
             await conn.commit()
         
         return {
             "id": doc_id,
             "title": title,
             "original_content": original_content,
-            "translated_content": "",
+            "translated_content": translated_content,
             "chunks_data": chunks_data,
-            "status": "processing",
+            "status": status,
+            "direction": direction,
             "created_at": now,
             "updated_at": now,
-            "is_translated": False
+            "version": 0,
+            "is_translated": bool(translated_content)
         }
     
-    async def get_document(self, doc_id: str) -> Optional[Dict]:
-        """Get a document by ID"""
+    @_timed
+    async def find_document_by_hash(self, content_hash: str) -> Optional[Dict]:
+        """
+        Find the best existing document with the given content hash:
+        completed documents first, then the most recently updated.
+        Returns id, status and chunks_data, or None.
+        """
         async with self._get_connection() as conn:
             conn.row_factory = aiosqlite.Row
             await self._ensure_initialized(conn)
             cursor = await conn.execute(
-                "SELECT * FROM documents WHERE id = ?", (doc_id,)
+                """SELECT id, status, chunks_data, content_format FROM documents
+                   WHERE content_hash = ?
+                   ORDER BY status = 'completed' DESC, updated_at DESC
+                   LIMIT 1""",
+                (content_hash,)
             )
             row = await cursor.fetchone()
-            
             if not row:
                 return None
-            
+            chunks_json, = await _decode_async(row["content_format"], row["chunks_data"])
             return {
                 "id": row["id"],
-                "title": row["title"],
-                "original_content": row["original_content"],
-                "translated_content": row["translated_content"] or "",
-                "chunks_data": json.loads(row["chunks_data"] or "[]"),
                 "status": row["status"],
-                "created_at": row["created_at"],
-                "updated_at": row["updated_at"],
-                "is_translated": bool(row["translated_content"])
+                "chunks_data": json.loads(chunks_json or "[]"),
             }
     
+    async def get_document(self, doc_id: str, fields: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Get a document by ID.
+        
+        Args:
+            doc_id: Document ID
+            fields: Fields to load (see DOCUMENT_FIELDS); DEFAULT_DOCUMENT_FIELDS when None.
+                Unknown names are ignored, so large columns that are not
+                requested are never read from disk or decompressed.
+        """
+        if fields is None:
+            fields = DEFAULT_DOCUMENT_FIELDS
+        else:
+            fields = [f for f in DOCUMENT_FIELDS if f in fields]
+        if not fields:
+            fields = ["id"]
+        
+        cacheable = self._document_cache.max_entries > 0 and not any(
+            f in UNCACHED_DOCUMENT_FIELDS for f in fields
+        )
+        if cacheable:
+            entry = self._document_cache.lookup(doc_id)
+            if entry is not None and all(f in entry.value for f in fields):
+                if entry.is_fresh(self._document_cache.ttl):
+                    self._document_cache.record("hit")
+                    return {f: entry.value[f] for f in fields}
+                if await self.get_document_version(doc_id) == entry.version:
+                    self._document_cache.revalidate(entry)
+                    self._document_cache.record("revalidated")
+                    return {f: entry.value[f] for f in fields}
+            self._document_cache.record("miss")
+        return await self._load_document(doc_id, fields, cacheable)
+    
+    # Cache hits never reach SQLite, so only the database read is timed
+    @SQLITE_OPERATION_SECONDS.time(method="get_document")
+    async def _load_document(self, doc_id: str, fields: List[str], cacheable: bool) -> Optional[Dict]:
+        """Read fields of a document from the database, storing them in the document cache if cacheable"""
+        # The version read in the same statement tags the cache entry
+        load_fields = fields if not cacheable or "version" in fields else fields + ["version"]
+        columns = ", ".join(f"{DOCUMENT_FIELDS[f]} AS {f}" for f in load_fields)
+        compressed = [f for f in load_fields if f in COMPRESSED_COLUMNS]
+        token = self._document_cache.begin_read()
+        
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            cursor = await conn.execute(
+                f"SELECT {columns}, content_format FROM documents WHERE id = ?", (doc_id,)
+            )
+            row = await cursor.fetchone()
+            
+            if not row:
+                self._document_cache.invalidate(doc_id)
+                return None
+            
+            doc = {field: row[field] for field in load_fields}
+            if compressed:
+                decoded = await _decode_async(row["content_format"], *(doc[f] for f in compressed))
+                doc.update(zip(compressed, decoded))
+            # Approximate memory footprint of the entry (characters of the large columns,
+            # chunks_data and structure_index included), counted before JSON parsing
+            size = sum(len(doc[f] or "") for f in compressed)
+            if "translated_content" in doc:
+                doc["translated_content"] = doc["translated_content"] or ""
+            if "chunks_data" in doc:
+                doc["chunks_data"] = json.loads(doc["chunks_data"] or "[]")
+            if "is_translated" in doc:
+                doc["is_translated"] = bool(doc["is_translated"])
+            if "version" in doc:
+                doc["version"] = doc["version"] or 0
+            if "structure_index" in doc:
+                doc["structure_index"] = json.loads(doc["structure_index"]) if doc["structure_index"] else None
+        
+        if cacheable:
+            entry = self._document_cache.lookup(doc_id)
+            if entry is not None and entry.version == doc["version"]:
+                # Same version: widen the cached projection instead of replacing it
+                size += entry.size
+                cached = {**entry.value, **doc}
+            else:
+                cached = doc
+            self._document_cache.put(doc_id, cached, doc["version"], size=size, token=token)
+        # Cached values are shared: callers must treat nested data (chunks_data, structure_index) as read-only
+        return {f: doc[f] for f in fields}
+    
+    @_timed
+    async def get_document_version(self, doc_id: str) -> Optional[int]:
+        """Get a document's content version without loading its content"""
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            cursor = await conn.execute(
+                "SELECT version FROM documents WHERE id = ?", (doc_id,)
+            )
+            row = await cursor.fetchone()
+            return (row["version"] or 0) if row else None
+    
+    @_timed
     async def get_all_documents(self) -> List[Dict]:
         """Get all documents (summary only, sorted by updated_at desc)"""
         async with self._get_connection() as conn:
             conn.row_factory = aiosqlite.Row
             await self._ensure_initialized(conn)
             cursor = await conn.execute(
-                """SELECT id, title, status, created_at, updated_at, translated_content
+                """SELECT id, title, status, created_at, updated_at,
+                          length(translated_content) > 0 AS is_translated
                    FROM documents ORDER BY updated_at DESC"""
             )
             rows = await cursor.fetchall()
@@ -130,51 +604,142 @@ class PersistentStore:
                     "status": row["status"],
                     "created_at": row["created_at"],
                     "updated_at": row["updated_at"],
-                    "is_translated": bool(row["translated_content"])
+                    "is_translated": bool(row["is_translated"])
                 }
                 for row in rows
             ]
     
-    async def update_chunk(self, doc_id: str, chunk_index: int, translated_text: str, status: str) -> bool:
-        """Update a chunk's translation and rebuild translated content"""
+    @_timed
+    async def set_structure_index(self, doc_id: str, structure_index: Dict) -> bool:
+        """Store the structural index of a document"""
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            # _encode output is valid in both formats: plain TEXT or a zlib BLOB.
+            # version is bumped so other workers' caches drop the old index too
+            cursor = await conn.execute(
+                """UPDATE documents SET structure_index = ?, content_format = MAX(content_format, ?),
+                                        version = version + 1
+                   WHERE id = ?""",
+                (_encode(json.dumps(structure_index, ensure_ascii=False)), CURRENT_FORMAT, doc_id)
+            )
+            await conn.commit()
+            self._document_cache.invalidate(doc_id)
+            return cursor.rowcount > 0
+    
+    @_timed
+    async def set_chunk_alignments(self, doc_id: str, alignments: Dict[int, Tuple[str, Any]]) -> bool:
+        """
+        Store alignments computed for chunks that were completed without one,
+        as {chunk_index: (translated_text, alignment)}. A chunk is skipped when
+        its translation changed since the alignment was computed.
+        """
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            await conn.execute("BEGIN IMMEDIATE")
+            cursor = await conn.execute(
+                "SELECT chunks_data, content_format FROM documents WHERE id = ?", (doc_id,)
+            )
+            row = await cursor.fetchone()
+            if not row:
+                await conn.rollback()
+                return False
+            
+            chunks_json, = await _decode_async(row["content_format"], row["chunks_data"])
+            chunks = json.loads(chunks_json or "[]")
+            changed = False
+            for chunk in chunks:
+                entry = alignments.get(chunk.get("chunk_index"))
+                if entry and chunk.get("alignment") is None and chunk.get("translated_text") == entry[0]:
+                    chunk["alignment"] = entry[1]
+                    changed = True
+            if not changed:
+                await conn.rollback()
+                return False
+            
+            # Content is unchanged, so updated_at stays; version is bumped so
+            # other workers' caches pick up the stored alignment
+            chunks_value, = await _encode_async(json.dumps(chunks, ensure_ascii=False))
+            await conn.execute(
+                """UPDATE documents SET chunks_data = ?, content_format = MAX(content_format, ?),
+                                        version = version + 1
+                   WHERE id = ?""",
+                (chunks_value, CURRENT_FORMAT, doc_id)
+            )
+            await conn.commit()
+            self._document_cache.invalidate(doc_id)
+            return True
+    
+    @_timed
+    async def update_chunk(self, doc_id: str, chunk_index: int, translated_text: str, status: str,
+                           extra: Optional[Dict] = None) -> bool:
+        """
+        Update a chunk's translation and rebuild translated content.
+        extra holds additional chunk keys to set; keys with a None value are removed.
+        """
         async with self._get_connection() as conn:
             conn.row_factory = aiosqlite.Row
             await self._ensure_initialized(conn)
+            # Chunks of one document complete concurrently; take the write lock
+            # before reading so read-modify-write updates cannot overwrite each other
+            await conn.execute("BEGIN IMMEDIATE")
             # Get current chunks
             cursor = await conn.execute(
-                "SELECT chunks_data FROM documents WHERE id = ?", (doc_id,)
+                "SELECT title, chunks_data, content_format FROM documents WHERE id = ?", (doc_id,)
             )
             row = await cursor.fetchone()
             
             if not row:
+                await conn.rollback()
                 return False
             
-            chunks = json.loads(row["chunks_data"] or "[]")
+            chunks_json, = await _decode_async(row["content_format"], row["chunks_data"])
+            chunks = json.loads(chunks_json or "[]")
             
             # Update the specific chunk
             for chunk in chunks:
                 if chunk.get("chunk_index") == chunk_index:
+                    await self._unindex_chunks(conn, doc_id, row["title"], [chunk])
                     chunk["translated_text"] = translated_text
                     chunk["status"] = status
+                    for key, value in (extra or {}).items():
+                        if value is None:
+                            chunk.pop(key, None)
+                        else:
+                            chunk[key] = value
                     break
             
             # Rebuild translated content
-            sorted_chunks = sorted(chunks, key=lambda x: x.get("chunk_index", 0))
-            translated_parts = [c.get("translated_text", "") for c in sorted_chunks if c.get("translated_text")]
-            translated_content = "".join(translated_parts)
+            translated_content = _join_translations(chunks)
             
             # Update database
             now = datetime.now().isoformat()
+            chunks_value, translated_value = await _encode_async(
+                json.dumps(chunks, ensure_ascii=False), translated_content
+            )
             await conn.execute(
                 """UPDATE documents 
-                   SET chunks_data = ?, translated_content = ?, updated_at = ?
+                   SET chunks_data = ?, translated_content = ?, updated_at = ?, version = version + 1,
+                       content_format = MAX(content_format, ?)
                    WHERE id = ?""",
-                (json.dumps(chunks, ensure_ascii=False), translated_content, now, doc_id)
+                (chunks_value, translated_value, now, CURRENT_FORMAT, doc_id)
+            )
+            for chunk in chunks:
+                if chunk.get("chunk_index") == chunk_index:
+                    await conn.execute(
+                        INSERT_SEARCH_ROW, (*_search_columns(row["title"], chunk), doc_id, chunk_index)
+                    )
+            await conn.execute(
+                "DELETE FROM chunk_checkpoints WHERE doc_id = ? AND chunk_index = ?",
+                (doc_id, chunk_index)
             )
             await conn.commit()
+            self._document_cache.invalidate(doc_id)
             
             return True
     
+    @_timed
     async def update_document_status(self, doc_id: str, status: str) -> bool:
         """Update document status"""
         now = datetime.now().isoformat()
@@ -183,41 +748,493 @@ class PersistentStore:
             conn.row_factory = aiosqlite.Row
             await self._ensure_initialized(conn)
             cursor = await conn.execute(
-                "UPDATE documents SET status = ?, updated_at = ? WHERE id = ?",
+                "UPDATE documents SET status = ?, updated_at = ?, version = version + 1 WHERE id = ?",
                 (status, now, doc_id)
             )
             await conn.commit()
+            self._document_cache.invalidate(doc_id)
             return cursor.rowcount > 0
     
+    @_timed
+    async def transition_document_status(self, doc_id: str, from_status: str, to_status: str,
+                                         updated_before: Optional[str] = None) -> bool:
+        """
+        Atomically change a document's status, but only if it is currently
+        from_status (and, when given, was last updated before updated_before).
+        Returns whether this caller made the change, so concurrent workers can
+        use it to claim a document.
+        """
+        now = datetime.now().isoformat()
+        query = "UPDATE documents SET status = ?, updated_at = ?, version = version + 1 WHERE id = ? AND status = ?"
+        params: List[Any] = [to_status, now, doc_id, from_status]
+        if updated_before is not None:
+            query += " AND updated_at < ?"
+            params.append(updated_before)
+        
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            cursor = await conn.execute(query, params)
+            await conn.commit()
+            self._document_cache.invalidate(doc_id)
+            return cursor.rowcount > 0
+    
+    @_timed
     async def delete_document(self, doc_id: str) -> bool:
         """Delete a document"""
         async with self._get_connection() as conn:
             conn.row_factory = aiosqlite.Row
             await self._ensure_initialized(conn)
+            deleted = await self._delete_document_rows(conn, doc_id)
+            await conn.commit()
+            self._document_cache.invalidate(doc_id)
+            return deleted
+    
+    async def _delete_document_rows(self, conn: aiosqlite.Connection, doc_id: str) -> bool:
+        """
+        Delete a document with its search index and checkpoint rows. The caller
+        commits and then invalidates the document cache entry.
+        """
+        cursor = await conn.execute(
+            "SELECT title, chunks_data, content_format FROM documents WHERE id = ?", (doc_id,)
+        )
+        row = await cursor.fetchone()
+        if row:
+            chunks_json, = await _decode_async(row["content_format"], row["chunks_data"])
+            await self._unindex_chunks(conn, doc_id, row["title"], json.loads(chunks_json or "[]"))
+        cursor = await conn.execute(
+            "DELETE FROM documents WHERE id = ?", (doc_id,)
+        )
+        await conn.execute("DELETE FROM search_chunks WHERE doc_id = ?", (doc_id,))
+        await conn.execute("DELETE FROM chunk_checkpoints WHERE doc_id = ?", (doc_id,))
+        return cursor.rowcount > 0
+    
+    async def _attach_archive(self, conn: aiosqlite.Connection):
+        """Attach the cold-storage database as schema 'archive'"""
+        await conn.execute("ATTACH DATABASE ? AS archive", (str(self.archive_path),))
+        await conn.execute(CREATE_ARCHIVE_TABLE)
+    
+    @_timed
+    async def archive_documents(self, updated_before: str, limit: int = 50) -> int:
+        """
+        Move up to limit documents not updated since updated_before into the
+        archive database, including translations abandoned half way (the age
+        cutoff already rules out live work); documents claimed for recovery
+        are skipped. Documents are packed outside the write transaction, so
+        any document written in the meantime (its version or status changed,
+        e.g. a translation that was resumed) is left in place.
+        Returns the number of archived documents.
+        """
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            await self._attach_archive(conn)
             cursor = await conn.execute(
-                "DELETE FROM documents WHERE id = ?", (doc_id,)
+                """SELECT * FROM documents
+                   WHERE updated_at < ? AND status != 'recovering'
+                   ORDER BY updated_at LIMIT ?""",
+                (updated_before, limit)
             )
+            rows = await cursor.fetchall()
+            if not rows:
+                return 0
+            
+            def pack(row) -> bytes:
+                doc = {key: row[key] for key in row.keys()}
+                for column in COMPRESSED_COLUMNS:
+                    doc[column] = _decode(doc[column], doc["content_format"])
+                doc["content_format"] = FORMAT_PLAIN
+                return zlib.compress(json.dumps(doc, ensure_ascii=False).encode("utf-8"), ARCHIVE_COMPRESSION_LEVEL)
+            
+            payloads = await asyncio.to_thread(lambda: [pack(row) for row in rows])
+            now = datetime.now().isoformat()
+            archived = []
+            await conn.execute("BEGIN IMMEDIATE")
+            for row, payload in zip(rows, payloads):
+                cursor = await conn.execute(
+                    "SELECT 1 FROM documents WHERE id = ? AND version IS ? AND status = ?",
+                    (row["id"], row["version"], row["status"])
+                )
+                if not await cursor.fetchone():
+                    continue
+                await conn.execute(
+                    """INSERT OR REPLACE INTO archive.archived_documents
+                           (id, title, status, direction, created_at, updated_at, archived_at, payload)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (row["id"], row["title"], row["status"], row["direction"],
+                     row["created_at"], row["updated_at"], now, payload)
+                )
+                await self._delete_document_rows(conn, row["id"])
+                archived.append(row["id"])
             await conn.commit()
-            return cursor.rowcount > 0
+            for doc_id in archived:
+                self._document_cache.invalidate(doc_id)
+            return len(archived)
     
-    async def get_setting(self, key: str) -> Optional[Any]:
-        """Get a setting value"""
+    @_timed
+    async def get_archived_documents(self) -> List[Dict]:
+        """List archived documents (summary only, most recently archived first)"""
+        if not self.archive_path.exists():
+            return []
         async with self._get_connection() as conn:
             conn.row_factory = aiosqlite.Row
             await self._ensure_initialized(conn)
+            await self._attach_archive(conn)
             cursor = await conn.execute(
-                "SELECT value FROM settings WHERE key = ?", (key,)
+                """SELECT id, title, status, direction, created_at, updated_at, archived_at,
+                          length(payload) AS archived_bytes
+                   FROM archive.archived_documents ORDER BY archived_at DESC"""
+            )
+            return [dict(row) for row in await cursor.fetchall()]
+    
+    @_timed
+    async def restore_archived_document(self, doc_id: str) -> bool:
+        """
+        Move a document from the archive back into the documents table.
+        Returns False when it is not archived; raises DocumentExistsError when
+        the documents table already has a document with the same id.
+        """
+        if not self.archive_path.exists():
+            return False
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            await self._attach_archive(conn)
+            cursor = await conn.execute(
+                "SELECT payload FROM archive.archived_documents WHERE id = ?", (doc_id,)
             )
             row = await cursor.fetchone()
-            
             if not row:
-                return None
+                return False
             
-            try:
-                return json.loads(row["value"])
-            except json.JSONDecodeError:
-                return row["value"]
+            doc = json.loads(await asyncio.to_thread(lambda: zlib.decompress(row["payload"]).decode("utf-8")))
+            encoded = await _encode_async(*(doc[column] for column in COMPRESSED_COLUMNS))
+            doc.update(zip(COMPRESSED_COLUMNS, encoded))
+            doc["content_format"] = CURRENT_FORMAT
+            # Restored content must not match ETags handed out before archiving, and
+            # a fresh updated_at keeps the next maintenance pass from re-archiving it
+            doc["version"] = (doc.get("version") or 0) + 1
+            doc["updated_at"] = datetime.now().isoformat()
+            
+            columns = list(doc.keys())
+            await conn.execute("BEGIN IMMEDIATE")
+            cursor = await conn.execute("SELECT 1 FROM documents WHERE id = ?", (doc_id,))
+            if await cursor.fetchone():
+                await conn.rollback()
+                raise DocumentExistsError(doc_id)
+            await conn.execute(
+                f"INSERT INTO documents ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                [doc[c] for c in columns]
+            )
+            chunks = json.loads(_decode(doc["chunks_data"], CURRENT_FORMAT) or "[]")
+            await self._index_chunks(conn, doc_id, doc["title"], chunks)
+            await conn.execute("DELETE FROM archive.archived_documents WHERE id = ?", (doc_id,))
+            await conn.commit()
+            return True
+    
+    @_timed
+    async def compress_documents(self, limit: int = 50) -> int:
+        """
+        Rewrite up to limit documents still stored in FORMAT_PLAIN in the
+        current format. Content is unchanged, so version is not bumped.
+        Rows are compressed before the write transaction starts, so the write
+        lock is only held for the UPDATEs; rows rewritten meanwhile (no longer
+        FORMAT_PLAIN) are left alone.
+        Returns the number of documents actually rewritten.
+        """
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            cursor = await conn.execute(
+                f"""SELECT id, {', '.join(COMPRESSED_COLUMNS)} FROM documents
+                    WHERE content_format = ? AND status NOT IN ('processing', 'recovering') LIMIT ?""",
+                (FORMAT_PLAIN, limit)
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                return 0
+            
+            updates = []
+            for row in rows:
+                encoded = await _encode_async(*(row[column] for column in COMPRESSED_COLUMNS))
+                updates.append((*encoded, CURRENT_FORMAT, row["id"], FORMAT_PLAIN))
+            
+            await conn.execute("BEGIN IMMEDIATE")
+            # executemany reports the total number of rows changed by all UPDATEs
+            cursor = await conn.executemany(
+                f"""UPDATE documents SET {', '.join(f'{c} = ?' for c in COMPRESSED_COLUMNS)}, content_format = ?
+                    WHERE id = ? AND content_format = ?""",
+                updates
+            )
+            rewritten = cursor.rowcount
+            await conn.commit()
+            return rewritten
+    
+    @_timed
+    async def incremental_vacuum(self, max_pages: int = 2000) -> int:
+        """
+        Return up to max_pages free pages to the filesystem. Does nothing on
+        databases without auto_vacuum=INCREMENTAL (see _enable_incremental_vacuum;
+        a full VACUUM would block writers for the whole rewrite).
+        Returns the number of pages freed.
+        """
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            cursor = await conn.execute("PRAGMA auto_vacuum")
+            if (await cursor.fetchone())[0] != 2:
+                return 0
+            
+            cursor = await conn.execute("PRAGMA freelist_count")
+            before = (await cursor.fetchone())[0]
+            # The pragma frees one page per step, but execute() steps a statement
+            # without result columns only once; executescript runs it to completion
+            await conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+            cursor = await conn.execute("PRAGMA freelist_count")
+            return before - (await cursor.fetchone())[0]
     
+    @_timed
+    async def save_checkpoints(self, entries: List[Tuple[str, int, str]],
+                               touched: Optional[List[Tuple[str, int]]] = None) -> None:
+        """
+        Upsert partial texts of in-flight chunks as (doc_id, chunk_index, partial_text),
+        and refresh updated_at of the (doc_id, chunk_index) checkpoints in touched
+        """
+        now = datetime.now().isoformat()
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            await conn.executemany(
+                """INSERT INTO chunk_checkpoints (doc_id, chunk_index, partial_text, updated_at)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(doc_id, chunk_index) DO UPDATE
+                   SET partial_text = excluded.partial_text, updated_at = excluded.updated_at""",
+                [(doc_id, chunk_index, text, now) for doc_id, chunk_index, text in entries]
+            )
+            if touched:
+                await conn.executemany(
+                    "UPDATE chunk_checkpoints SET updated_at = ? WHERE doc_id = ? AND chunk_index = ?",
+                    [(now, doc_id, chunk_index) for doc_id, chunk_index in touched]
+                )
+            await conn.commit()
+    
+    @_timed
+    async def get_checkpoints(self, doc_id: str) -> Dict[int, str]:
+        """Get checkpointed partial texts of a document, keyed by chunk index"""
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            cursor = await conn.execute(
+                "SELECT chunk_index, partial_text FROM chunk_checkpoints WHERE doc_id = ?",
+                (doc_id,)
+            )
+            rows = await cursor.fetchall()
+            return {row["chunk_index"]: row["partial_text"] or "" for row in rows}
+    
+    @_timed
+    async def delete_checkpoints(self, doc_id: str) -> None:
+        """Remove all checkpoints of a document"""
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            await conn.execute("DELETE FROM chunk_checkpoints WHERE doc_id = ?", (doc_id,))
+            await conn.commit()
+    
+    @_timed
+    async def get_documents_by_status(self, status: str) -> List[Dict]:
+        """Get id, direction, updated_at and chunks of all documents in a given status"""
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            cursor = await conn.execute(
+                "SELECT id, direction, updated_at, chunks_data, content_format FROM documents WHERE status = ?",
+                (status,)
+            )
+            rows = await cursor.fetchall()
+            return [
+                {
+                    "id": row["id"],
+                    "direction": row["direction"] or "en2zh",
+                    "updated_at": row["updated_at"],
+                    "chunks_data": json.loads(_decode(row["chunks_data"], row["content_format"]) or "[]"),
+                }
+                for row in rows
+            ]
+    
+    @_timed
+    async def get_checkpointed_document_ids(self, updated_before: Optional[str] = None) -> List[str]:
+        """
+        Get ids of documents that have chunks interrupted mid-translation.
+        With updated_before, only documents none of whose checkpoints was written since then.
+        """
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            if updated_before is None:
+                cursor = await conn.execute("SELECT DISTINCT doc_id FROM chunk_checkpoints")
+            else:
+                cursor = await conn.execute(
+                    "SELECT doc_id FROM chunk_checkpoints GROUP BY doc_id HAVING MAX(updated_at) < ?",
+                    (updated_before,)
+                )
+            rows = await cursor.fetchall()
+            return [row["doc_id"] for row in rows]
+    
+    @_timed
+    async def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        Full-text search over titles, source and translated chunk text.
+        Returns chunk-level hits ranked by bm25, best first.
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        
+        # The trigram index matches terms of 3+ characters directly and two-character
+        # CJK terms through cjk_bigrams; hits are filtered by any other short term
+        if self.search_tokenizer == SEARCH_TOKENIZER:
+            match_terms = [t for t in terms if len(t) >= MIN_MATCH_TERM_LENGTH]
+            bigram_terms = [t for t in terms if CJK_BIGRAM.fullmatch(t)]
+        else:
+            match_terms, bigram_terms = terms, []
+        filter_terms = [t for t in terms if t not in match_terms and t not in bigram_terms]
+        
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            if not match_terms and not bigram_terms:
+                return await self._search_scan(conn, terms, limit)
+            
+            # Quote every term so user input is never parsed as FTS5 syntax
+            match_expr = " AND ".join(
+                [SEARCH_TEXT_COLUMNS + ' : "' + t.replace('"', '""') + '"' for t in match_terms]
+                + ['cjk_bigrams : "' + t + ' "' for t in bigram_terms]
+            )
+            cursor = await conn.execute(
+                f"""SELECT c.doc_id, c.chunk_index, bm25(search_fts) AS score
+                   FROM search_fts f
+                   JOIN search_chunks c ON c.rowid = f.rowid
+                   WHERE search_fts MATCH ?
+                   ORDER BY score
+                   {"" if filter_terms else "LIMIT ?"}""",
+                (match_expr,) if filter_terms else (match_expr, limit)
+            )
+            
+            # The index holds no text: read matching chunks from their (compressed) documents
+            documents: Dict[str, Optional[Tuple[str, Dict[int, Dict]]]] = {}
+            hits = []
+            while len(hits) < limit:
+                rows = await cursor.fetchmany(SEARCH_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    if row["doc_id"] not in documents:
+                        documents[row["doc_id"]] = await self._load_search_chunks(conn, row["doc_id"])
+                    if documents[row["doc_id"]] is None:
+                        continue
+                    title, chunks = documents[row["doc_id"]]
+                    chunk = chunks.get(row["chunk_index"])
+                    if chunk is None or not _contains_all(title, chunk, filter_terms):
+                        continue
+                    hits.append(_search_hit(row["doc_id"], title, chunk, terms, -row["score"]))
+                    if len(hits) >= limit:
+                        break
+            return hits
+    
+    async def _load_search_chunks(self, conn: aiosqlite.Connection,
+                                  doc_id: str) -> Optional[Tuple[str, Dict[int, Dict]]]:
+        """Title and chunks (by index) of a document, for building search results"""
+        cursor = await conn.execute(
+            "SELECT title, chunks_data, content_format FROM documents WHERE id = ?", (doc_id,)
+        )
+        row = await cursor.fetchone()
+        if not row:
+            return None
+        chunks_json, = await _decode_async(row["content_format"], row["chunks_data"])
+        chunks = json.loads(chunks_json or "[]")
+        return row["title"], {c.get("chunk_index", 0): c for c in chunks}
+    
+    async def _search_scan(self, conn: aiosqlite.Connection, terms: List[str], limit: int) -> List[Dict]:
+        """
+        Unranked substring scan of the most recently updated documents, used when
+        no term can be looked up in the index. Decoding runs in a worker thread.
+        """
+        cursor = await conn.execute(
+            "SELECT id, title, chunks_data, content_format FROM documents ORDER BY updated_at DESC LIMIT ?",
+            (SEARCH_SCAN_MAX_DOCUMENTS,)
+        )
+        
+        def scan(rows) -> List[Dict]:
+            found = []
+            for row in rows:
+                for chunk in json.loads(_decode(row["chunks_data"], row["content_format"]) or "[]"):
+                    if _contains_all(row["title"], chunk, terms):
+                        found.append(_search_hit(row["id"], row["title"], chunk, terms, 0.0))
+                        if len(found) >= limit:
+                            return found
+            return found
+        
+        hits = []
+        while len(hits) < limit:
+            rows = await cursor.fetchmany(SEARCH_BATCH_SIZE)
+            if not rows:
+                break
+            hits += await asyncio.to_thread(scan, rows)
+        return hits[:limit]
+    
+    @_timed
+    async def record_usage(self, doc_id: str, direction: str, model: str,
+                           prompt_tokens: int, completion_tokens: int, cost: float) -> None:
+        """Add the token usage of one LLM request to a document's totals"""
+        now = datetime.now().isoformat()
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            await conn.execute(
+                """INSERT INTO document_usage
+                       (doc_id, direction, model, prompt_tokens, completion_tokens, cost, requests, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+                   ON CONFLICT(doc_id, direction, model) DO UPDATE SET
+                       prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                       completion_tokens = completion_tokens + excluded.completion_tokens,
+                       cost = cost + excluded.cost,
+                       requests = requests + 1,
+                       updated_at = excluded.updated_at""",
+                (doc_id, direction, model, prompt_tokens, completion_tokens, cost, now)
+            )
+            await conn.commit()
+    
+    @_timed
+    async def get_usage(self, doc_id: Optional[str] = None) -> List[Dict]:
+        """
+        Get token usage and cost. Per direction and model for one document,
+        or totals per direction and model across all documents when doc_id is None.
+        """
+        async with self._get_connection() as conn:
+            conn.row_factory = aiosqlite.Row
+            await self._ensure_initialized(conn)
+            if doc_id:
+                cursor = await conn.execute(
+                    """SELECT direction, model, prompt_tokens, completion_tokens, cost, requests
+                       FROM document_usage WHERE doc_id = ?""",
+                    (doc_id,)
+                )
+            else:
+                cursor = await conn.execute(
+                    """SELECT direction, model, SUM(prompt_tokens) AS prompt_tokens,
+                              SUM(completion_tokens) AS completion_tokens, SUM(cost) AS cost,
+                              SUM(requests) AS requests, COUNT(DISTINCT doc_id) AS documents
+                       FROM document_usage GROUP BY direction, model"""
+                )
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    async def get_setting(self, key: str) -> Optional[Any]:
+        """Get a setting value"""
+        settings = await self.get_all_settings()
+        return settings.get(key)
+    
+    @_timed
     async def set_setting(self, key: str, value: Any) -> bool:
         """Set a setting value"""
         value_json = json.dumps(value, ensure_ascii=False) if not isinstance(value, str) else value
@@ -230,26 +1247,52 @@ class PersistentStore:
                    ON CONFLICT(key) DO UPDATE SET value = excluded.value""",
                 (key, value_json)
             )
+            await conn.execute(BUMP_SETTINGS_VERSION)
             await conn.commit()
+            self._settings_cache.clear()
             return True
     
     async def get_all_settings(self) -> Dict:
-        """Get all settings"""
+        """Get all settings (served from the settings cache while its version is current)"""
+        cache = self._settings_cache
+        entry = cache.lookup("settings")
+        if entry is not None and entry.is_fresh(cache.ttl):
+            cache.record("hit")
+            return dict(entry.value)
+        
+        token = cache.begin_read()
+        version, rows = await self._read_settings(entry.version if entry is not None else None)
+        if rows is None:
+            cache.revalidate(entry)
+            cache.record("revalidated")
+            return dict(entry.value)
+        
+        settings = {}
+        for row in rows:
+            try:
+                settings[row["key"]] = json.loads(row["value"])
+            except json.JSONDecodeError:
+                settings[row["key"]] = row["value"]
+        
+        cache.record("miss")
+        cache.put("settings", settings, version, token=token)
+        return dict(settings)
+    
+    @SQLITE_OPERATION_SECONDS.time(method="get_all_settings")
+    async def _read_settings(self, cached_version: Optional[int]) -> Tuple[int, Optional[list]]:
+        """Current settings version, and the settings rows unless that version equals cached_version"""
         async with self._get_connection() as conn:
             conn.row_factory = aiosqlite.Row
             await self._ensure_initialized(conn)
+            cursor = await conn.execute("SELECT version FROM store_versions WHERE name = 'settings'")
+            row = await cursor.fetchone()
+            version = row["version"] if row else 0
+            if version == cached_version:
+                return version, None
             cursor = await conn.execute("SELECT key, value FROM settings")
-            rows = await cursor.fetchall()
-            
-            settings = {}
-            for row in rows:
-                try:
-                    settings[row["key"]] = json.loads(row["value"])
-                except json.JSONDecodeError:
-                    settings[row["key"]] = row["value"]
-            
-            return settings
+            return version, await cursor.fetchall()
     
+    @_timed
     async def set_all_settings(self, settings: Dict) -> bool:
         """Set multiple settings at once"""
         async with self._get_connection() as conn:
@@ -262,9 +1305,63 @@ class PersistentStore:
                        ON CONFLICT(key) DO UPDATE SET value = excluded.value""",
                     (key, value_json)
                 )
+            await conn.execute(BUMP_SETTINGS_VERSION)
             await conn.commit()
+            self._settings_cache.clear()
             return True
 
 
+def _search_columns(title: str, chunk: Dict) -> Tuple[str, str, str, str]:
+    """Values indexed in search_fts for one chunk"""
+    title, raw, translated = title or "", chunk.get("raw_text") or "", chunk.get("translated_text") or ""
+    bigrams = dict.fromkeys(
+        run[i:i + 2] for text in (title, raw, translated) for run in CJK_RUN.findall(text) for i in range(len(run) - 1)
+    )
+    return title, raw, translated, "".join(b + " " for b in bigrams)
+
+
+def _contains_all(title: str, chunk: Dict, terms: List[str]) -> bool:
+    """Whether every term occurs (case-insensitively) in the title, source or translation of a chunk"""
+    if not terms:
+        return True
+    text = "\n".join((title or "", chunk.get("raw_text") or "", chunk.get("translated_text") or "")).lower()
+    return all(t.lower() in text for t in terms)
+
+
+def _search_hit(doc_id: str, title: str, chunk: Dict, terms: List[str], score: float) -> Dict:
+    return {
+        "doc_id": doc_id,
+        "chunk_index": chunk.get("chunk_index", 0),
+        "title": title,
+        "source_snippet": _make_snippet(chunk.get("raw_text") or "", terms),
+        "translated_snippet": _make_snippet(chunk.get("translated_text") or "", terms),
+        "score": score
+    }
+
+
+def _make_snippet(text: str, terms: List[str], width: int = 40) -> str:
+    """
+    Build a snippet around the first matching term with every term wrapped in
+    <mark>. The text is HTML-escaped, so the snippet is safe to render as HTML.
+    """
+    if not text:
+        return ""
+    pattern = re.compile(
+        "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE
+    )
+    match = pattern.search(text)
+    if not match:
+        return html.escape(text[:width * 2]) + ("…" if len(text) > width * 2 else "")
+    start = max(0, match.start() - width)
+    end = min(len(text), match.end() + width)
+    # re.split with a capturing group alternates plain text and matches
+    parts = re.split(f"({pattern.pattern})", text[start:end], flags=re.IGNORECASE)
+    return (
+        ("…" if start > 0 else "")
+        + "".join(html.escape(p) if i % 2 == 0 else f"<mark>{html.escape(p)}</mark>" for i, p in enumerate(parts))
+        + ("…" if end < len(text) else "")
+    )
+
+
 # Global instance
 store = PersistentStore()
@@ -2,17 +2,28 @@ import os
 import json
 import asyncio
 import uuid
+import hashlib
 from typing import List, Dict, Optional, Any, Set
 import threading
 import time
+from datetime import datetime, timedelta
 
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, APIError, BadRequestError
 import httpx
 
-from persistent_storage import store as document_store
-from markdown_utils import split_into_chunks
+from persistent_storage import DOCUMENT_FIELDS, DocumentExistsError, store as document_store
+from checkpoint import checkpoints
+from maintenance import maintenance
+from metrics import (
+    registry, Gauge, LLM_TTFT_SECONDS, LLM_TOKENS_PER_SECOND, LLM_TOKENS_TOTAL, LLM_COST_TOTAL,
+    UPSTREAM_ERRORS_TOTAL, CHUNK_ERRORS_TOTAL, CHUNK_LATENCY_SECONDS, DOCUMENT_LATENCY_SECONDS, QUEUE_WAIT_SECONDS,
+    VALIDATION_FAILURES_TOTAL, VALIDATION_RETRIES_TOTAL, WS_SEND_SECONDS, WS_SENT_BYTES_TOTAL, WS_MESSAGES_TOTAL,
+)
+from markdown_utils import (md, split_into_chunks, build_document_index, validate_translation, align_blocks,
+                            document_alignment)
 
 router = APIRouter()
 
@@ -41,6 +52,24 @@ def get_openai_client() -> AsyncOpenAI:
                 )
     return _openai_client
 
+def use_mock_llm() -> bool:
+    """未配置 API Key 时不调用 LLM，输出模拟译文"""
+    api_key = os.getenv("QWEN_API_KEY")
+    return not api_key or api_key == "your_api_key_here"
+
+def partial_resume_enabled() -> bool:
+    """
+    LLM_PARTIAL_RESUME=1 时用 Qwen 的 partial 模式从检查点续写；默认从头重译被中断的分块，
+    因为不支持 partial 的 OpenAI 兼容服务会忽略该字段并返回完整译文
+    """
+    return os.getenv("LLM_PARTIAL_RESUME", "").lower() in ("1", "true", "yes")
+
+def estimate_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """按 .env 中配置的每 1K token 单价估算费用（未配置时为 0）"""
+    prompt_price = float(os.getenv("LLM_PRICE_PROMPT_PER_1K", "0"))
+    completion_price = float(os.getenv("LLM_PRICE_COMPLETION_PER_1K", "0"))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
 # --- Request/Response Models ---
 class TranslateRequest(BaseModel):
     content: str
@@ -70,6 +99,16 @@ class ConnectionManager:
     def _conn_key(self, doc_id: str, connection_id: str) -> str:
         return f"{doc_id}/{connection_id}"
 
+    @staticmethod
+    async def _send_json(ws: WebSocket, message: dict):
+        """序列化方式与 WebSocket.send_json 一致，额外记录发送耗时和字节数"""
+        text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        start = time.perf_counter()
+        await ws.send_text(text)
+        WS_SEND_SECONDS.observe(time.perf_counter() - start)
+        WS_SENT_BYTES_TOTAL.inc(len(text.encode("utf-8")))
+        WS_MESSAGES_TOTAL.inc()
+
     async def connect(self, doc_id: str, connection_id: str, websocket: WebSocket):
         """连接新的 WebSocket 客户端"""
         await websocket.accept()
@@ -111,7 +150,7 @@ class ConnectionManager:
         try:
             ws = self.active_connections.get(doc_id, {}).get(connection_id)
             if ws:
-                await ws.send_json(message)
+                await self._send_json(ws, message)
                 return True
         except Exception:
             # 连接已失效，静默处理，标记为关闭
@@ -124,7 +163,7 @@ class ConnectionManager:
             dead_connections = []
             for conn_id, ws in list(self.active_connections.get(doc_id, {}).items()):
                 try:
-                    await ws.send_json(message)
+                    await self._send_json(ws, message)
                 except Exception:
                     dead_connections.append(conn_id)
             for conn_id in dead_connections:
@@ -166,21 +205,61 @@ def build_user_prompt(content: str, pre_context: str = "", post_context: str = "
         prompt += f"[Post-Context (Do not translate)]:\n{post_context}\n"
     return prompt
 
-# --- Translation Logic ---
-# 存储每个文档的翻译方向
-doc_directions: Dict[str, str] = {}
+def build_repair_note(issues: List[str], direction: str = "en2zh") -> str:
+    """结构校验失败后重译时追加到系统提示词的更严格要求"""
+    target_lang = "Chinese" if direction == "en2zh" else "English"
+    problems = "\n".join(f"- {issue}" for issue in issues)
+    return (
+        "\n\nIMPORTANT: A previous translation of this text was rejected because it did not match "
+        f"the source:\n{problems}\n"
+        "Keep exactly the same Markdown structure as the source: the same headings with the same levels, "
+        "the same code blocks (left untranslated), tables with the same rows and columns, and every link "
+        "and image. Do not add, merge or drop blocks, do not wrap the output in a code block, "
+        f"and output only the {target_lang} translation."
+    )
+
+# --- Translation Validation ---
+# 结构校验失败后用更严格的提示词重译的默认次数（设置项 validation_retries）
+DEFAULT_VALIDATION_RETRIES = 1
+# validation_retries 的上限，避免错误设置导致无限次重译
+MAX_VALIDATION_RETRIES = 3
+# 超过该长度的分块在线程池中校验/对齐，避免阻塞事件循环
+VALIDATION_OFFLOAD_CHARS = 20_000
+# 续写时比较续写内容与检查点开头的字符数，用于发现上游忽略了 partial 模式、从头输出
+RESUME_CHECK_CHARS = 64
+
+async def _run_markdown_task(func, source: str, translated: str, *args):
+    """对原文和译文执行 markdown 解析任务，大分块放到线程池中"""
+    if len(source) + len(translated) > VALIDATION_OFFLOAD_CHARS:
+        return await asyncio.to_thread(func, source, translated, *args)
+    return func(source, translated, *args)
+
+async def check_translation(source: str, translated: str, direction: str) -> List[str]:
+    """校验译文与原文的 Markdown 结构和目标语言，返回问题列表"""
+    return await _run_markdown_task(validate_translation, source, translated, direction)
 
+async def compute_alignment(source: str, translated: str) -> List[List[int]]:
+    """分块内原文块与译文块的对齐（分块内的相对行号）"""
+    return await _run_markdown_task(align_blocks, source, translated)
+
+# --- Translation Logic ---
 # 每个连接的翻译会话类
 class TranslationSession:
     """
     每个翻译会话独立管理自己的并发控制
-    支持取消和连接状态检查
+    会话只在被取消时停止（WebSocket 处理器在客户端离开时取消），
+    向已关闭的连接发送失败不会中止翻译，服务重启时进行中的分块可以继续完成
+    connection_id 为 None 时为无连接的后台会话（用于重启后的恢复），
+    更新会广播给该文档当前的所有连接
     """
-    def __init__(self, doc_id: str, connection_id: str, chunks_per_session: int = 5):
+    def __init__(self, doc_id: str, connection_id: Optional[str], chunks_per_session: int = 5,
+                 direction: str = "en2zh", checkpointed: Optional[Dict[int, str]] = None):
         self.doc_id = doc_id
         self.connection_id = connection_id
         self.semaphore = asyncio.Semaphore(chunks_per_session)
-        self.direction = doc_directions.get(doc_id, "en2zh")
+        self.direction = direction
+        # 上次中断时各分块已生成的部分译文，用于续写
+        self.checkpointed = checkpointed or {}
         self.cancelled = False
         self._tasks: List[asyncio.Task] = []
         # 节流控制：限制消息发送频率
@@ -189,7 +268,7 @@ class TranslationSession:
 
     def is_active(self) -> bool:
         """检查会话是否仍然有效"""
-        return not self.cancelled and manager.is_connected(self.doc_id, self.connection_id)
+        return not self.cancelled
 
     def cancel(self):
         """取消翻译会话"""
@@ -215,9 +294,119 @@ class TranslationSession:
                 return True  # 跳过这次发送，但返回成功
             self._last_send_time[chunk_idx] = now
         
+        if self.connection_id is None:
+            await manager.broadcast_to_doc(self.doc_id, message)
+            return True
         return await manager.send_message(self.doc_id, self.connection_id, message)
 
-    async def translate_chunk(self, chunk: dict, client: AsyncOpenAI, pre_context: str, post_context: str):
+    async def _open_stream(self, client: AsyncOpenAI, system_content: str, user_content: str, partial_text: str):
+        """
+        发起流式请求。partial_text 非空时（LLM_PARTIAL_RESUME 开启）使用 partial 模式让模型从断点续写，
+        服务端拒绝时退回到从头翻译
+        """
+        messages = [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": user_content}
+        ]
+        model = os.getenv("QWEN_MODEL_NAME", "qwen-flash")
+        if partial_text:
+            try:
+                stream = await client.chat.completions.create(
+                    model=model,
+                    messages=messages + [{"role": "assistant", "content": partial_text, "partial": True}],
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    temperature=0.1,
+                )
+                return stream, partial_text
+            except BadRequestError as e:
+                print(f"[Session] Resume not supported, restarting chunk: {e}")
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            temperature=0.1,
+        )
+        return stream, ""
+
+    async def _record_usage(self, usage, streamed_deltas: int):
+        """记录一次请求的 token 用量和费用；上游未返回 usage 时以流式片段数估算输出 token"""
+        prompt_tokens = (usage.prompt_tokens or 0) if usage else 0
+        completion_tokens = (usage.completion_tokens or 0) if usage else streamed_deltas
+        cost = estimate_cost(prompt_tokens, completion_tokens)
+        LLM_TOKENS_TOTAL.inc(prompt_tokens, direction=self.direction, kind="prompt")
+        LLM_TOKENS_TOTAL.inc(completion_tokens, direction=self.direction, kind="completion")
+        LLM_COST_TOTAL.inc(cost, direction=self.direction)
+        await document_store.record_usage(
+            self.doc_id, self.direction, os.getenv("QWEN_MODEL_NAME", "qwen-flash"),
+            prompt_tokens, completion_tokens, cost
+        )
+
+    async def _stream_chunk(self, client: AsyncOpenAI, chunk_index: int, system_content: str,
+                            user_content: str, resume_text: str):
+        """
+        流式翻译一次并实时推送、写检查点。
+        返回完整译文，会话失效时返回 None
+        """
+        started_at = time.perf_counter()
+        stream, prefix = await self._open_stream(client, system_content, user_content, resume_text)
+        # 续写内容以检查点开头重复出现时，说明上游忽略了 partial 模式，丢弃检查点只保留新输出
+        prefix_checked = not prefix
+        continuation = ""
+        full_text = prefix
+        
+        # 流式片段数（一个片段可能包含多个 token）
+        deltas = 0
+        first_token_at = 0.0
+        usage = None
+        try:
+            async for part in stream:
+                if not self.is_active():
+                    return None
+                
+                # include_usage 时最后一个包只有 usage，没有 choices
+                if part.usage:
+                    usage = part.usage
+                if not part.choices:
+                    continue
+                content = part.choices[0].delta.content or ""
+                if content:
+                    if not deltas:
+                        first_token_at = time.perf_counter()
+                        LLM_TTFT_SECONDS.observe(first_token_at - started_at)
+                    continuation += content
+                    if not prefix_checked and len(continuation) >= min(len(prefix), RESUME_CHECK_CHARS):
+                        prefix_checked = True
+                        if continuation.startswith(prefix[:RESUME_CHECK_CHARS]):
+                            print(f"[Session] Upstream ignored partial mode, chunk {chunk_index} restarted")
+                            prefix = ""
+                    full_text = prefix + continuation
+                    deltas += 1
+                    checkpoints.record(self.doc_id, chunk_index, full_text)
+                    # 每 3 个片段或带节流发送一次更新
+                    if deltas % 3 == 0:
+                        await self.send_update({
+                            "type": "chunk_update",
+                            "chunkIndex": chunk_index,
+                            "data": {"translatedText": full_text}
+                        })
+            
+            # 吞吐按上游返回的输出 token 数计算（首个 token 之后），没有 usage 时不记录
+            elapsed = time.perf_counter() - first_token_at
+            if usage and usage.completion_tokens and deltas and elapsed > 0:
+                LLM_TOKENS_PER_SECOND.observe(max(usage.completion_tokens - 1, 0) / elapsed)
+        finally:
+            # 断开、上游中途出错或任务取消时 token 也已消耗，同样计入用量
+            # （没有收到 usage 包时按已流式收到的片段数估算）
+            try:
+                await self._record_usage(usage, deltas)
+            except Exception as e:
+                print(f"[Session] Failed to record usage: {e}")
+        return full_text
+
+    async def translate_chunk(self, chunk: dict, client: AsyncOpenAI, pre_context: str, post_context: str,
+                              queued_at: float = 0.0):
         """翻译单个 chunk"""
         if not self.is_active():
             return
@@ -225,23 +414,25 @@ class TranslationSession:
         async with self.semaphore:
             if not self.is_active():
                 return
-                
+            
+            started_at = time.perf_counter()
+            if queued_at:
+                QUEUE_WAIT_SECONDS.observe(started_at - queued_at)
             chunk_index = chunk["chunk_index"]
+            resume_text = self.checkpointed.get(chunk_index, "") if partial_resume_enabled() else ""
             
             # 发送处理中状态 (强制发送)
-            if not await self.send_update({
+            await self.send_update({
                 "type": "chunk_update",
                 "chunkIndex": chunk_index,
-                "data": {"status": "processing", "translatedText": ""}
-            }, force=True):
-                return
+                "data": {"status": "processing", "translatedText": resume_text}
+            }, force=True)
             
             try:
                 user_content = build_user_prompt(chunk["raw_text"], pre_context, post_context, self.direction)
                 system_content = load_system_prompt(self.direction)
                 
-                api_key = os.getenv("QWEN_API_KEY")
-                if not api_key or api_key == "your_api_key_here":
+                if use_mock_llm():
                     await asyncio.sleep(0.1)
                     if not self.is_active():
                         return
@@ -252,49 +443,73 @@ class TranslationSession:
                         "chunkIndex": chunk_index,
                         "data": {"status": "completed", "translatedText": mock_text}
                     }, force=True)
-                    await document_store.update_chunk(self.doc_id, chunk_index, mock_text, "completed")
+                    await document_store.update_chunk(
+                        self.doc_id, chunk_index, mock_text, "completed",
+                        extra={"alignment": await compute_alignment(chunk["raw_text"], mock_text)}
+                    )
                     return
 
-                stream = await client.chat.completions.create(
-                    model=os.getenv("QWEN_MODEL_NAME", "qwen-flash"),
-                    messages=[
-                        {"role": "system", "content": system_content},
-                        {"role": "user", "content": user_content}
-                    ],
-                    stream=True,
-                    temperature=0.1,
-                )
+                settings = await document_store.get_all_settings()
+                try:
+                    max_retries = int(settings.get("validation_retries", DEFAULT_VALIDATION_RETRIES))
+                    max_retries = min(max(max_retries, 0), MAX_VALIDATION_RETRIES)
+                except (TypeError, ValueError):
+                    max_retries = DEFAULT_VALIDATION_RETRIES
                 
-                full_text = ""
-                token_count = 0
-                async for part in stream:
-                    if not self.is_active():
+                # 标记为进行中，即使首个 token 前崩溃也能在启动时被发现
+                checkpoints.record(self.doc_id, chunk_index, resume_text)
+                issues: List[str] = []
+                for attempt in range(max_retries + 1):
+                    if attempt:
+                        # 结构校验未通过：带上问题列表和更严格的要求，从头重译该分块
+                        VALIDATION_RETRIES_TOTAL.inc(direction=self.direction)
+                        print(f"[Session] Retrying chunk {chunk_index} ({attempt}/{max_retries}): {'; '.join(issues)}")
+                        system_content = load_system_prompt(self.direction) + build_repair_note(issues, self.direction)
+                        resume_text = ""
+                        checkpoints.record(self.doc_id, chunk_index, "")
+                        await self.send_update({
+                            "type": "chunk_update",
+                            "chunkIndex": chunk_index,
+                            "data": {"status": "processing", "translatedText": "", "validationIssues": issues}
+                        }, force=True)
+                    
+                    full_text = await self._stream_chunk(client, chunk_index, system_content, user_content, resume_text)
+                    if full_text is None:
                         return
                     
-                    content = part.choices[0].delta.content or ""
-                    if content:
-                        full_text += content
-                        token_count += 1
-                        # 每 3 个 token 或带节流发送一次更新
-                        if token_count % 3 == 0:
-                            await self.send_update({
-                                "type": "chunk_update",
-                                "chunkIndex": chunk_index,
-                                "data": {"translatedText": full_text}
-                            })
+                    issues = await check_translation(chunk["raw_text"], full_text, self.direction)
+                    if not issues:
+                        break
+                    VALIDATION_FAILURES_TOTAL.inc(direction=self.direction)
                 
-                # 最终完成状态 (强制发送)
+                # 最终完成状态 (强制发送)；重试用尽仍未通过时保留最后一次译文并标注问题
+                data = {"status": "completed", "translatedText": full_text}
+                if issues:
+                    data["validationIssues"] = issues
                 await self.send_update({
                     "type": "chunk_update",
                     "chunkIndex": chunk_index,
-                    "data": {"status": "completed", "translatedText": full_text}
+                    "data": data
                 }, force=True)
                 
-                await document_store.update_chunk(self.doc_id, chunk_index, full_text, "completed")
+                alignment = await compute_alignment(chunk["raw_text"], full_text)
+                checkpoints.discard(self.doc_id, chunk_index)
+                await document_store.update_chunk(
+                    self.doc_id, chunk_index, full_text, "completed",
+                    extra={"validation_issues": issues or None, "alignment": alignment}
+                )
+                
+                CHUNK_LATENCY_SECONDS.observe(time.perf_counter() - started_at, status="completed")
                 
             except asyncio.CancelledError:
                 raise
             except Exception as e:
+                # 连接中断等网络错误在流式读取中途可能以 httpx 异常抛出，同样算作上游失败
+                if isinstance(e, (APIError, httpx.HTTPError)):
+                    UPSTREAM_ERRORS_TOTAL.inc(type=type(e).__name__)
+                else:
+                    CHUNK_ERRORS_TOTAL.inc(type=type(e).__name__)
+                CHUNK_LATENCY_SECONDS.observe(time.perf_counter() - started_at, status="error")
                 if self.is_active():
                     print(f"[Session] Error chunk {chunk_index}: {e}")
                     await self.send_update({
@@ -302,7 +517,11 @@ class TranslationSession:
                         "chunkIndex": chunk_index,
                         "data": {"status": "error"}
                     }, force=True)
+                checkpoints.discard(self.doc_id, chunk_index)
                 await document_store.update_chunk(self.doc_id, chunk_index, "", "error")
+            finally:
+                # 被取消或会话失效时保留检查点，但不再续期，其他进程过期后可以接手
+                checkpoints.release(self.doc_id, chunk_index)
 
     async def run_translation(self, chunks: list, client: AsyncOpenAI):
         """运行整个翻译会话"""
@@ -314,7 +533,7 @@ class TranslationSession:
                 pre_context = chunks[i-1]["raw_text"][-200:] if i > 0 else ""
                 post_context = chunks[i+1]["raw_text"][:200] if i < len(chunks) - 1 else ""
                 task = asyncio.create_task(
-                    self.translate_chunk(chunk, client, pre_context, post_context)
+                    self.translate_chunk(chunk, client, pre_context, post_context, queued_at=time.perf_counter())
                 )
                 self._tasks.append(task)
         
@@ -322,44 +541,399 @@ class TranslationSession:
             # 等待所有任务完成，忽略取消的任务
             await asyncio.gather(*self._tasks, return_exceptions=True)
 
+# --- Crash Recovery ---
+# 重启后在后台恢复的文档 {doc_id: Task}
+recovery_tasks: Dict[str, asyncio.Task] = {}
+# 同时恢复的文档数上限，避免启动时瞬间打满上游
+MAX_CONCURRENT_RECOVERIES = 3
+# 多个 worker 共享数据库时，恢复前先把文档从 processing 原子地改为 recovering 以认领；
+# 认领后超过该秒数没有任何更新（认领的 worker 已崩溃）的文档可被重新认领
+RECOVERY_LEASE_SECONDS = 600
+# 定期检查过期认领的间隔秒数：认领者崩溃后在租约期内重启的 worker 不会在启动时接手
+RECOVERY_CHECK_INTERVAL = 60
+recovery_watchdog: Optional[asyncio.Task] = None
+
+def _public_status(status: str) -> str:
+    """recovering 只是内部认领状态，对外仍报告为 processing"""
+    return "processing" if status == "recovering" else status
+
+async def _recover_document(doc_id: str, direction: str, chunks: list, semaphore: asyncio.Semaphore):
+    """在无连接的后台会话中继续翻译被中断的文档"""
+    async with semaphore:
+        await checkpoints.flush()
+        checkpointed = await document_store.get_checkpoints(doc_id)
+        pending = {c["chunk_index"] for c in chunks if c.get("status") == "pending"}
+        session = TranslationSession(
+            doc_id, None, chunks_per_session=5, direction=direction,
+            checkpointed={i: t for i, t in checkpointed.items() if i in pending}
+        )
+        active_sessions[f"{doc_id}/recovery"] = session
+        completed = False
+        try:
+            started_at = time.perf_counter()
+            await session.run_translation(chunks, get_openai_client())
+            if session.is_active():
+                DOCUMENT_LATENCY_SECONDS.observe(time.perf_counter() - started_at)
+                await document_store.update_document_status(doc_id, "completed")
+                completed = True
+                await manager.broadcast_to_doc(doc_id, {"type": "complete"})
+                print(f"[Recovery] Resumed and completed doc={doc_id[:8]}")
+        finally:
+            active_sessions.pop(f"{doc_id}/recovery", None)
+            recovery_tasks.pop(doc_id, None)
+            if not completed:
+                # 被中断（如退出）时交还认领，下次启动可立即再恢复
+                await document_store.transition_document_status(doc_id, "recovering", "processing")
+
+async def _claim_for_recovery(doc_id: str, lease_cutoff: str) -> bool:
+    """原子地认领待恢复文档：processing，或租约已过期的 recovering"""
+    if await document_store.transition_document_status(doc_id, "processing", "recovering"):
+        return True
+    return await document_store.transition_document_status(
+        doc_id, "recovering", "recovering", updated_before=lease_cutoff
+    )
+
+async def recover_interrupted_translations():
+    """
+    启动时的恢复流程：
+    - 状态为 processing 但所有分块都已结束的文档，修正为 completed
+    - 有检查点（翻译到一半被中断）的文档，认领成功后在后台从检查点继续翻译
+    - 已完成分块上残留的检查点直接清理
+    多个 worker 同时启动时，每个文档只会被一个 worker 认领并恢复。
+    只处理检查点已过期（最近 checkpoints.stale_after 秒内没有写入或续期）的文档：
+    其他 worker 正在翻译的分块每次批量写入时都会续期，不会被当作中断
+    """
+    stale_cutoff = (datetime.now() - timedelta(seconds=checkpoints.stale_after)).isoformat()
+    interrupted = set(await document_store.get_checkpointed_document_ids(updated_before=stale_cutoff))
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_RECOVERIES)
+    lease_cutoff = (datetime.now() - timedelta(seconds=RECOVERY_LEASE_SECONDS)).isoformat()
+    
+    # 其他 worker 正在恢复（租约未过期）的文档，其检查点不能清理
+    for doc in await document_store.get_documents_by_status("recovering"):
+        if doc["updated_at"] and doc["updated_at"] >= lease_cutoff:
+            interrupted.discard(doc["id"])
+    
+    candidates = await document_store.get_documents_by_status("processing")
+    candidates += await document_store.get_documents_by_status("recovering")
+    for doc in candidates:
+        doc_id = doc["id"]
+        if doc_id in recovery_tasks:
+            # 本进程正在恢复（可能还在排队），检查点不能清理
+            interrupted.discard(doc_id)
+            continue
+        chunks = doc["chunks_data"]
+        has_pending = any(c.get("status") == "pending" for c in chunks)
+        
+        if chunks and not has_pending:
+            await document_store.update_document_status(doc_id, "completed")
+            await document_store.delete_checkpoints(doc_id)
+            print(f"[Recovery] Reconciled finished doc={doc_id[:8]}")
+        elif doc_id in interrupted:
+            if await _claim_for_recovery(doc_id, lease_cutoff):
+                recovery_tasks[doc_id] = asyncio.create_task(
+                    _recover_document(doc_id, doc["direction"], chunks, semaphore)
+                )
+        interrupted.discard(doc_id)
+    
+    # 剩下的检查点属于已完成或已删除的文档
+    for doc_id in interrupted:
+        await document_store.delete_checkpoints(doc_id)
+    
+    if recovery_tasks:
+        print(f"[Recovery] Resuming {len(recovery_tasks)} interrupted document(s)")
+
+async def resume_expired_recoveries():
+    """重新认领并继续租约已过期的 recovering 文档（认领的 worker 已崩溃）"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_RECOVERIES)
+    lease_cutoff = (datetime.now() - timedelta(seconds=RECOVERY_LEASE_SECONDS)).isoformat()
+    for doc in await document_store.get_documents_by_status("recovering"):
+        doc_id = doc["id"]
+        if doc_id in recovery_tasks or (doc["updated_at"] and doc["updated_at"] >= lease_cutoff):
+            continue
+        if await _claim_for_recovery(doc_id, lease_cutoff):
+            print(f"[Recovery] Reclaimed expired recovery doc={doc_id[:8]}")
+            recovery_tasks[doc_id] = asyncio.create_task(
+                _recover_document(doc_id, doc["direction"], doc["chunks_data"], semaphore)
+            )
+
+async def _watch_recoveries():
+    # 启动时检查点尚未过期的文档可能属于刚崩溃的进程，过期后立即再检查一次
+    delay = checkpoints.stale_after
+    while True:
+        await asyncio.sleep(delay)
+        delay = RECOVERY_CHECK_INTERVAL
+        try:
+            await recover_interrupted_translations()
+            await resume_expired_recoveries()
+        except Exception as e:
+            print(f"[Recovery] Error: {type(e).__name__}: {e}")
+
+async def startup():
+    """应用启动：配置存储缓存，开始定期写检查点和存储维护，恢复被中断的翻译"""
+    document_store.configure_cache()
+    checkpoints.start()
+    maintenance.start()
+    await recover_interrupted_translations()
+    global recovery_watchdog
+    recovery_watchdog = asyncio.create_task(_watch_recoveries())
+
+async def shutdown():
+    """
+    应用退出：取消剩余会话（后台恢复会话），并把最新的部分译文写入检查点。
+    WebSocket 会话在此之前已由各自的处理器收尾，见 websocket_translate_handler
+    """
+    for session in list(active_sessions.values()):
+        session.cancel()
+    if recovery_watchdog:
+        recovery_watchdog.cancel()
+    for task in list(recovery_tasks.values()):
+        task.cancel()
+    await maintenance.stop()
+    await checkpoints.stop()
+
+# --- Deduplication ---
+def compute_content_hash(content: str, direction: str, model: str, num_chunks: int) -> str:
+    """
+    文档去重键：源内容 + 翻译方向 + 模型 + 分块设置。
+    llm 标记区分真实译文，旧版本按不含该标记的哈希保存的文档（可能是模拟译文）不会再被复用
+    """
+    digest = hashlib.sha256()
+    for part in ("llm", direction, model, str(num_chunks)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(content.encode("utf-8"))
+    return digest.hexdigest()
+
+def reuse_completed_chunks(chunks: list, source_chunks: list) -> list:
+    """用已有文档中原文相同、已完成且通过结构校验的分块替换新分块，其余保持 pending"""
+    completed = {
+        c.get("chunk_index"): c for c in source_chunks
+        if c.get("status") == "completed" and not c.get("validation_issues")
+    }
+    reused = []
+    for chunk in chunks:
+        source = completed.get(chunk["chunk_index"])
+        if source and source.get("raw_text") == chunk["raw_text"]:
+            reused.append({**chunk, **source})
+        else:
+            reused.append(chunk)
+    return reused
+
 # --- Document Endpoints ---
 @router.post("/api/translate")
 async def create_translation_task(request: TranslateRequest):
     doc_id = str(uuid.uuid4())
     
-    # 保存翻译方向
     direction = request.direction or "en2zh"
-    doc_directions[doc_id] = direction
     
     # Get num_chunks from settings (default: 3)
     settings = await document_store.get_all_settings()
     num_chunks = settings.get("num_chunks", 3)
     
-    chunks = split_into_chunks(request.content, num_chunks=num_chunks)
+    # 只解析一次，分块和结构索引共用同一个 token 流
+    tokens = md.parse(request.content)
+    chunks = split_into_chunks(request.content, num_chunks=num_chunks, tokens=tokens)
+    structure_index = build_document_index(request.content, chunks, tokens=tokens)
     title = request.title or f"文档 {doc_id[:8]}"
     
-    await document_store.create_document(
+    # 相同内容、方向、模型和分块设置的文档已存在时，直接复用其已完成的分块。
+    # 模拟模式的译文不是真实翻译，既不登记哈希也不复用
+    content_hash = None
+    duplicate = None
+    if not use_mock_llm():
+        model = os.getenv("QWEN_MODEL_NAME", "qwen-flash")
+        content_hash = compute_content_hash(request.content, direction, model, num_chunks)
+        duplicate = await document_store.find_document_by_hash(content_hash)
+    if duplicate:
+        chunks = reuse_completed_chunks(chunks, duplicate["chunks_data"])
+    
+    doc = await document_store.create_document(
         doc_id=doc_id,
         title=title,
         original_content=request.content,
-        chunks_data=chunks
+        chunks_data=chunks,
+        structure_index=structure_index,
+        direction=direction,
+        content_hash=content_hash
     )
     
-    return {"docId": doc_id, "chunks": chunks, "direction": direction}
+    response = {"docId": doc_id, "chunks": chunks, "direction": direction, "status": _public_status(doc["status"])}
+    if duplicate:
+        response["deduplicatedFrom"] = duplicate["id"]
+    return response
 
 @router.get("/api/documents")
 async def get_all_documents():
     """Get all saved documents"""
     docs = await document_store.get_all_documents()
+    for doc in docs:
+        doc["status"] = _public_status(doc["status"])
     return {"documents": docs}
 
+def _document_etag(version: int, fields: Optional[str], chunk_start: Optional[int], chunk_end: Optional[int]) -> str:
+    """强 ETag：文档版本号 + 本次请求的投影/分块范围（不同表示对应不同 ETag）"""
+    variant = f"{fields or ''}|{chunk_start}|{chunk_end}"
+    digest = hashlib.sha1(variant.encode("utf-8")).hexdigest()[:8]
+    return f'"v{version}-{digest}"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    解析 If-None-Match（可能为列表或 *）。按 RFC 9110 使用弱比较：
+    代理压缩响应后会把 ETag 改为 W/"..."，客户端带回时同样视为命中
+    """
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in [c[2:] if c.startswith("W/") else c for c in candidates]
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """解析字段投影参数，包含未知字段时返回 400 并列出这些字段"""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in DOCUMENT_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(DOCUMENT_FIELDS)})"
+        )
+    return requested
+
 @router.get("/api/documents/{doc_id}")
-async def get_document(doc_id: str):
-    """Get a specific document with full content"""
-    doc = await document_store.get_document(doc_id)
+async def get_document(
+    doc_id: str,
+    request: Request,
+    fields: Optional[str] = Query(None, description="逗号分隔的字段列表，如 status,chunks_data"),
+    chunk_start: Optional[int] = Query(None, ge=0, description="起始分块索引（包含）"),
+    chunk_end: Optional[int] = Query(None, ge=0, description="结束分块索引（不包含）")
+):
+    """
+    Get a specific document.
+    支持字段投影、分块范围以及基于版本号的 ETag / 304 Not Modified
+    """
+    requested = _parse_fields(fields)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # 只读取版本号即可判断是否命中，无需加载文档内容
+        version = await document_store.get_document_version(doc_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        etag = _document_etag(version, fields, chunk_start, chunk_end)
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    
+    load_fields = None if requested is None else requested + ["version"]
+    doc = await document_store.get_document(doc_id, fields=load_fields)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    etag = _document_etag(doc["version"], fields, chunk_start, chunk_end)
+    if requested is not None and "version" not in requested:
+        doc.pop("version")
+    if "status" in doc:
+        doc["status"] = _public_status(doc["status"])
+    
+    if "chunks_data" in doc and (chunk_start is not None or chunk_end is not None):
+        start = chunk_start or 0
+        end = chunk_end if chunk_end is not None else len(doc["chunks_data"])
+        doc["total_chunks"] = len(doc["chunks_data"])
+        doc["chunks_data"] = [
+            c for c in doc["chunks_data"] if start <= c.get("chunk_index", 0) < end
+        ]
+    
+    return JSONResponse(doc, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+async def _load_structure_index(doc_id: str) -> Dict:
+    """读取文档结构索引；旧文档没有索引时现场构建并回写"""
+    doc = await document_store.get_document(doc_id, fields=["structure_index"])
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if doc["structure_index"] is not None:
+        return doc["structure_index"]
+    
+    doc = await document_store.get_document(doc_id, fields=["original_content", "chunks_data"])
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    structure_index = build_document_index(doc["original_content"] or "", doc["chunks_data"])
+    await document_store.set_structure_index(doc_id, structure_index)
+    return structure_index
+
+@router.get("/api/documents/{doc_id}/outline")
+async def get_document_outline(doc_id: str):
+    """获取文档大纲：标题树、顶层块行号和分块到章节的映射"""
+    structure_index = await _load_structure_index(doc_id)
+    return {"id": doc_id, **structure_index}
+
+@router.get("/api/documents/{doc_id}/sections/{section_id}")
+async def get_document_section(doc_id: str, section_id: str, include_translation: bool = True):
+    """按章节 ID 获取原文片段及其所在分块的译文"""
+    structure_index = await _load_structure_index(doc_id)
+    section = next((h for h in structure_index["headings"] if h["id"] == section_id), None)
+    if not section:
+        raise HTTPException(status_code=404, detail="Section not found")
+    
+    fields = ["original_content", "chunks_data"] if include_translation else ["original_content"]
+    doc = await document_store.get_document(doc_id, fields=fields)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    lines = (doc["original_content"] or "").splitlines(keepends=True)
+    result = {
+        **section,
+        "content": "".join(lines[section["start_line"]:section["end_line"]]),
+    }
+    if include_translation:
+        # 译文以分块为粒度，返回与该章节重叠的所有分块
+        result["chunks"] = [
+            {
+                "chunk_index": c["chunk_index"],
+                "start_line": c.get("start_line"),
+                "end_line": c.get("end_line"),
+                "status": c.get("status"),
+                "translated_text": c.get("translated_text"),
+            }
+            for c in doc["chunks_data"]
+            if c.get("start_line", 0) < section["end_line"] and c.get("end_line", 0) > section["start_line"]
+        ]
+    return result
+
+@router.get("/api/documents/{doc_id}/alignment")
+async def get_document_alignment(doc_id: str, request: Request):
+    """
+    原文与译文的块级对齐表，用于同步滚动。
+    blocks 为扁平整数数组，每 4 个一组：[原文起始行, 原文结束行, 译文起始行, 译文结束行]（结束行不含），
+    行号相对整篇原文 / 按分块拼接的整篇译文，两列起始行均单调递增，可直接二分查找。
+    只包含已完成的分块，随分块完成增量更新；支持 ETag 条件请求。
+    """
+    version = await document_store.get_document_version(doc_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    etag = _document_etag(version, "alignment", None, None)
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    
+    doc = await document_store.get_document(doc_id, fields=["version", "chunks_data"])
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
-    return doc
+    
+    chunks = []
+    computed = {}
+    for chunk in doc["chunks_data"]:
+        if chunk.get("status") == "completed" and chunk.get("alignment") is None:
+            # 旧文档的分块没有保存对齐，计算一次并回写，之后的请求直接读取
+            translated_text = chunk.get("translated_text") or ""
+            alignment = await compute_alignment(chunk.get("raw_text") or "", translated_text)
+            computed[chunk["chunk_index"]] = (translated_text, alignment)
+            chunk = {**chunk, "alignment": alignment}
+        chunks.append(chunk)
+    blocks = document_alignment(chunks)
+    if computed:
+        await document_store.set_chunk_alignments(doc_id, computed)
+    
+    return JSONResponse(
+        {"id": doc_id, "version": doc["version"], "blocks": blocks},
+        headers={"ETag": _document_etag(doc["version"], "alignment", None, None), "Cache-Control": "no-cache"}
+    )
 
 @router.delete("/api/documents/{doc_id}")
 async def delete_document(doc_id: str):
@@ -369,6 +943,33 @@ async def delete_document(doc_id: str):
         raise HTTPException(status_code=404, detail="Document not found")
     return {"success": True}
 
+# --- Archive Endpoints ---
+@router.get("/api/archive")
+async def get_archived_documents():
+    """超过保留期限、已归档到冷存储的文档"""
+    return {"documents": await document_store.get_archived_documents()}
+
+@router.post("/api/archive/{doc_id}/restore")
+async def restore_archived_document(doc_id: str):
+    """将归档文档恢复到文档列表；文档列表中已有同 id 的文档时返回 409，归档保持不变"""
+    try:
+        restored = await document_store.restore_archived_document(doc_id)
+    except DocumentExistsError:
+        raise HTTPException(status_code=409, detail="A document with this id already exists")
+    if not restored:
+        raise HTTPException(status_code=404, detail="Archived document not found")
+    return {"success": True}
+
+# --- Search Endpoint ---
+@router.get("/api/search")
+async def search_documents(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """全文检索：按相关度返回命中的分块及摘要片段"""
+    hits = await document_store.search(q, limit=limit)
+    return {"query": q, "hits": hits}
+
 # --- Status/Monitoring Endpoint ---
 @router.get("/api/status")
 async def get_status():
@@ -380,9 +981,31 @@ async def get_status():
         "connections_by_doc": {
             doc_id[:8]: len(conns) 
             for doc_id, conns in manager.active_connections.items()
-        }
+        },
+        "cache": document_store.cache_stats()
     }
 
+# --- Metrics / Usage Endpoints ---
+registry.register(Gauge(
+    "mdt_active_connections", "Open WebSocket connections", callback=lambda: manager.get_connection_count()))
+registry.register(Gauge(
+    "mdt_active_sessions", "Running translation sessions", callback=lambda: len(active_sessions)))
+
+@router.get("/metrics")
+async def get_metrics():
+    """Prometheus 文本格式的指标"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/api/usage")
+async def get_usage():
+    """按翻译方向和模型汇总的 token 用量与费用"""
+    return {"usage": await document_store.get_usage()}
+
+@router.get("/api/documents/{doc_id}/usage")
+async def get_document_usage(doc_id: str):
+    """单个文档的 token 用量与费用"""
+    return {"id": doc_id, "usage": await document_store.get_usage(doc_id)}
+
 # --- Settings Endpoints ---
 @router.get("/api/settings")
 async def get_settings():
@@ -394,7 +1017,9 @@ async def get_settings():
         "llm_model": os.getenv("QWEN_MODEL_NAME", "qwen-flash"),
         "temperature": 0.1,
         "num_chunks": 3,
-        "auto_save": True
+        "auto_save": True,
+        "retention_days": 0,
+        "validation_retries": DEFAULT_VALIDATION_RETRIES
     }
     return {**defaults, **settings}
 
@@ -408,24 +1033,55 @@ async def save_settings(request: SettingsRequest):
 # --- WebSocket Endpoint ---
 # 存储活跃的翻译会话，用于在断开时取消
 active_sessions: Dict[str, TranslationSession] = {}
+# 服务端重启/退出时 uvicorn 关闭 WebSocket 使用的关闭码（Service Restart）
+SERVICE_RESTART_CLOSE_CODE = 1012
+# 服务重启关闭连接后，进行中的会话继续翻译的默认最长秒数（SHUTDOWN_DRAIN_SECONDS）
+DEFAULT_SHUTDOWN_DRAIN_SECONDS = 10.0
+
+async def _receive_until_close(websocket: WebSocket) -> int:
+    """忽略客户端发来的消息直到连接关闭，返回关闭码"""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return message.get("code", 1000)
+    except Exception:
+        return 1006
+
+async def _discard_abandoned_checkpoints(doc_id: str, chunks: list):
+    """客户端主动离开时丢弃文档的检查点，启动时不会为无人等待的文档继续消耗 token"""
+    for chunk in chunks:
+        checkpoints.discard(doc_id, chunk["chunk_index"])
+    # 等待进行中的批量写入结束，避免刚删除的检查点又被写回
+    await checkpoints.flush()
+    await document_store.delete_checkpoints(doc_id)
 
 async def websocket_translate_handler(websocket: WebSocket, doc_id: str, connection_id: str = None):
     """
     WebSocket handler for translation
     每个连接创建独立的 TranslationSession，完全并行处理
-    支持在断开时取消正在进行的翻译
+    客户端断开时取消正在进行的翻译并丢弃检查点；
+    服务重启导致的断开（uvicorn 在 lifespan 退出前以 1012 关闭连接）时，
+    会话再继续翻译最多 SHUTDOWN_DRAIN_SECONDS 秒，未完成的分块保留检查点，下次启动时继续
     """
     if not connection_id:
         connection_id = str(uuid.uuid4())
     
     session_key = f"{doc_id}/{connection_id}"
     session = None
+    closed = None
+    abandoned = False
     
     await manager.connect(doc_id, connection_id, websocket)
     print(f"[WS] New connection: doc={doc_id[:8]}, conn={connection_id[:20]}")
     
     try:
-        doc = await document_store.get_document(doc_id)
+        # 该文档正在后台恢复时，等待恢复完成（期间的更新会广播给本连接）
+        recovery = recovery_tasks.get(doc_id)
+        if recovery and not recovery.done():
+            await asyncio.shield(recovery)
+        
+        doc = await document_store.get_document(doc_id, fields=["id", "direction", "chunks_data"])
         
         if not doc:
             print(f"[WS] Document {doc_id[:8]} not found")
@@ -439,27 +1095,43 @@ async def websocket_translate_handler(websocket: WebSocket, doc_id: str, connect
         pending_count = sum(1 for c in chunks if c.get("status") == "pending")
         print(f"[WS] Starting: {pending_count} chunks, conn={connection_id[:16]}")
         
+        # 之前的连接中断时留下的部分译文，从断点续写
+        checkpointed = {}
+        if pending_count:
+            await checkpoints.flush()
+            checkpointed = await document_store.get_checkpoints(doc_id)
+        
         # 创建独立的翻译会话
-        session = TranslationSession(doc_id, connection_id, chunks_per_session=5)
+        session = TranslationSession(
+            doc_id, connection_id, chunks_per_session=5,
+            direction=doc["direction"] or "en2zh", checkpointed=checkpointed
+        )
         active_sessions[session_key] = session
         
-        # 运行翻译
-        await session.run_translation(chunks, client)
+        # 翻译的同时等待连接关闭，以便按关闭码区分客户端离开和服务重启
+        closed = asyncio.create_task(_receive_until_close(websocket))
+        started_at = time.perf_counter()
+        translation = asyncio.create_task(session.run_translation(chunks, client))
+        await asyncio.wait({translation, closed}, return_when=asyncio.FIRST_COMPLETED)
+        
+        if not translation.done() and closed.result() == SERVICE_RESTART_CLOSE_CODE:
+            # uvicorn 等待处理器返回后才执行 lifespan 退出，所以在这里等待会话收尾
+            drain = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", DEFAULT_SHUTDOWN_DRAIN_SECONDS))
+            print(f"[Shutdown] Draining doc={doc_id[:8]}, up to {drain:.0f}s")
+            await asyncio.wait({translation}, timeout=drain)
         
-        # 检查是否被取消
-        if session.is_active():
+        finished = False
+        if translation.done() and session.is_active():
+            if pending_count:
+                DOCUMENT_LATENCY_SECONDS.observe(time.perf_counter() - started_at)
             await document_store.update_document_status(doc_id, "completed")
             await manager.send_message(doc_id, connection_id, {"type": "complete"})
+            finished = True
             print(f"[WS] Complete: conn={connection_id[:16]}")
         
-        # 保持连接
-        while manager.is_connected(doc_id, connection_id):
-            try:
-                await asyncio.wait_for(websocket.receive_text(), timeout=30)
-            except asyncio.TimeoutError:
-                continue
-            except WebSocketDisconnect:
-                break
+        # 保持连接直到关闭
+        close_code = await closed
+        abandoned = not finished and close_code != SERVICE_RESTART_CLOSE_CODE
             
     except WebSocketDisconnect:
         pass  # 正常断开，静默处理
@@ -469,8 +1141,14 @@ async def websocket_translate_handler(websocket: WebSocket, doc_id: str, connect
         print(f"[WS] Error: {type(e).__name__}: {e}")
     finally:
         # 清理
+        if closed:
+            closed.cancel()
         if session:
             session.cancel()
         if session_key in active_sessions:
             del active_sessions[session_key]
         await manager.disconnect(doc_id, connection_id)
+        # 同一文档的其他连接可能仍在翻译，只在最后一个连接离开时丢弃
+        if abandoned and not manager.get_connection_count(doc_id):
+            await _discard_abandoned_checkpoints(doc_id, chunks)
+            print(f"[WS] Abandoned doc={doc_id[:8]}, checkpoints discarded")
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Backend modules are imported as top-level modules, as when running main.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# The global store opens MDTRANSLATOR_DB_PATH at import time; keep tests off data/mdtranslator.db
+os.environ["MDTRANSLATOR_DB_PATH"] = str(Path(tempfile.mkdtemp(prefix="mdt-tests-")) / "test.db")
@@ -0,0 +1,50 @@
+from markdown_utils import align_blocks, document_alignment, split_into_chunks
+
+
+def _completed(chunk, translated_text):
+    return {
+        **chunk,
+        "translated_text": translated_text,
+        "status": "completed",
+        "alignment": align_blocks(chunk["raw_text"], translated_text),
+    }
+
+
+def _assert_monotonic(blocks):
+    assert len(blocks) % 4 == 0
+    source_starts = blocks[0::4]
+    translated_starts = blocks[2::4]
+    assert source_starts == sorted(source_starts)
+    assert translated_starts == sorted(translated_starts)
+    for i in range(0, len(blocks), 4):
+        assert blocks[i] <= blocks[i + 1]
+        assert blocks[i + 2] <= blocks[i + 3]
+
+
+def test_translation_without_trailing_newline():
+    source = "# Title\n\nIntro.\n\nSecond.\n\n## Next\n\nMore.\n"
+    first, second = split_into_chunks(source, 2)
+    chunks = [
+        # The last paragraph is dropped and the text does not end with a newline
+        _completed(first, "# 标题\n\n介绍段落。"),
+        _completed(second, "## 下一节\n\n更多。\n"),
+    ]
+    blocks = document_alignment(chunks)
+    _assert_monotonic(blocks)
+    # The second chunk starts on the line shared with the end of the first
+    assert blocks[-8] == first["end_line"]
+    assert blocks[-6] == 2
+
+
+def test_pending_chunks_are_skipped():
+    source = "# A\n\none\n\n# B\n\ntwo\n\n# C\n\nthree\n"
+    chunks = split_into_chunks(source, 3)
+    chunks = [
+        _completed(chunks[0], "# 甲\n\n一\n"),
+        {**chunks[1], "translated_text": "# 乙\n", "status": "processing"},
+        _completed(chunks[2], "# 丙\n\n三\n\n多余的段落\n"),
+    ]
+    blocks = document_alignment(chunks)
+    _assert_monotonic(blocks)
+    # The third chunk starts after the partial translation of the second
+    assert blocks[2::4][-3:] == [4, 6, 8]
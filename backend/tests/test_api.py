@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from routers.translate import document_store
+
+SOURCE = "# Title\n\nFirst paragraph.\n\nSecond paragraph.\n"
+TRANSLATION = "# 标题\n\n第一段。\n\n第二段。\n"
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def _create_completed(chunks_text=((SOURCE, TRANSLATION),), **chunk_extra) -> str:
+    doc_id = str(uuid.uuid4())
+    chunks = [
+        {"chunk_index": i, "raw_text": raw, "translated_text": translated, "status": "completed", **chunk_extra}
+        for i, (raw, translated) in enumerate(chunks_text)
+    ]
+    asyncio.run(document_store.create_document(doc_id, "api test", SOURCE, chunks))
+    return doc_id
+
+
+def test_legacy_alignment_is_computed_once(client):
+    # Chunks completed before alignments were stored have none
+    doc_id = _create_completed()
+
+    first = client.get(f"/api/documents/{doc_id}/alignment")
+    assert first.status_code == 200
+    stored = asyncio.run(document_store.get_document(doc_id, fields=["chunks_data"]))
+    assert stored["chunks_data"][0]["alignment"] is not None
+
+    second = client.get(f"/api/documents/{doc_id}/alignment")
+    assert second.json()["blocks"] == first.json()["blocks"]
+
+
+def test_search_two_character_cjk_query(client):
+    doc_id = _create_completed(((SOURCE, "# 标题\n\n鲲鹏展翅，具身智能体。\n"),))
+    hits = client.get("/api/search", params={"q": "鲲鹏"}).json()["hits"]
+    assert doc_id in [hit["doc_id"] for hit in hits]
+
+
+@pytest.mark.parametrize("query", ['"quoted"', "C++", "(v2)", "a*b", "title:foo", "NEAR(x"])
+def test_search_treats_fts_syntax_as_text(client, query):
+    raw = 'Uses C++ (v2) with "quoted" a*b title:foo and NEAR(x.\n'
+    doc_id = _create_completed(((raw, TRANSLATION),))
+    response = client.get("/api/search", params={"q": query})
+    assert response.status_code == 200
+    assert doc_id in [hit["doc_id"] for hit in response.json()["hits"]]
+
+
+def test_document_etag_and_not_modified(client):
+    doc_id = _create_completed()
+    url = f"/api/documents/{doc_id}"
+    response = client.get(url, params={"fields": "status"})
+    etag = response.headers["etag"]
+
+    assert client.get(url, params={"fields": "status"}, headers={"If-None-Match": etag}).status_code == 304
+    weak = client.get(url, params={"fields": "status"}, headers={"If-None-Match": f"W/{etag}"})
+    assert weak.status_code == 304
+    # Another projection is another representation
+    assert client.get(url, params={"fields": "title"}, headers={"If-None-Match": etag}).status_code == 200
+
+    asyncio.run(document_store.update_document_status(doc_id, "completed"))
+    assert client.get(url, params={"fields": "status"}, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_unknown_fields_are_rejected(client):
+    doc_id = _create_completed()
+    response = client.get(f"/api/documents/{doc_id}", params={"fields": "status,bogus"})
+    assert response.status_code == 400
+    assert "bogus" in response.json()["detail"]
+
+
+def test_duplicate_upload_reuses_completed_chunks(client, monkeypatch):
+    monkeypatch.setenv("QWEN_API_KEY", "test")
+    content = f"# Dedup {uuid.uuid4()}\n\nSome paragraph to translate.\n"
+    first = client.post("/api/translate", json={"content": content}).json()
+    for chunk in first["chunks"]:
+        asyncio.run(document_store.update_chunk(first["docId"], chunk["chunk_index"], TRANSLATION, "completed"))
+
+    second = client.post("/api/translate", json={"content": content}).json()
+    assert second["deduplicatedFrom"] == first["docId"]
+    assert second["status"] == "completed"
+    assert [c["translated_text"] for c in second["chunks"]] == [TRANSLATION] * len(first["chunks"])
@@ -0,0 +1,23 @@
+from markdown_utils import build_document_index, split_into_chunks
+
+
+def _heading_ids(content):
+    index = build_document_index(content, split_into_chunks(content, 1))
+    return [(h["id"], h["parent"]) for h in index["headings"]]
+
+
+def test_repeated_headings_get_suffixes():
+    assert _heading_ids("# x\n\n# x\n\n# x\n") == [("x", None), ("x-1", None), ("x-2", None)]
+
+
+def test_suffix_does_not_collide_with_real_slug():
+    headings = _heading_ids("# x\n\n# x\n\n## x-1\n")
+    ids = [heading_id for heading_id, _ in headings]
+    assert len(set(ids)) == len(ids)
+    # The "x-1" subsection belongs to the second "x", not to itself
+    assert headings[2][1] == headings[1][0]
+
+
+def test_real_slug_before_repeat():
+    ids = [heading_id for heading_id, _ in _heading_ids("# x-1\n\n# x\n\n# x\n")]
+    assert ids == ["x-1", "x", "x-2"]
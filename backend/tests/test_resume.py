@@ -0,0 +1,95 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from routers import translate
+from routers.translate import TranslationSession, document_store
+
+SOURCE = "Resuming a chunk must not duplicate the text that was already streamed.\n"
+TRANSLATION = "恢复分块时不能重复已经流式输出的文本，检查点之后只能接上剩余的部分译文。\n"
+CHECKPOINT = TRANSLATION[:12]
+
+
+class FakeCompletions:
+    """Streams a fixed reply; honours_partial decides whether a partial assistant message is continued"""
+
+    def __init__(self, honours_partial: bool):
+        self.honours_partial = honours_partial
+        self.requests = []
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        last = kwargs["messages"][-1]
+        text = TRANSLATION
+        if self.honours_partial and last.get("partial"):
+            text = TRANSLATION[len(last["content"]):]
+        return self._stream(text)
+
+    async def _stream(self, text):
+        for i in range(0, len(text), 4):
+            delta = SimpleNamespace(content=text[i:i + 4])
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])
+        yield SimpleNamespace(usage=SimpleNamespace(prompt_tokens=10, completion_tokens=20), choices=[])
+
+
+def _resume(monkeypatch, honours_partial: bool, partial_resume: bool):
+    monkeypatch.setenv("QWEN_API_KEY", "test")
+    monkeypatch.setenv("LLM_PARTIAL_RESUME", "1" if partial_resume else "0")
+    completions = FakeCompletions(honours_partial)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    doc_id = str(uuid.uuid4())
+    chunk = {"chunk_index": 0, "raw_text": SOURCE, "translated_text": None, "status": "pending"}
+
+    async def run():
+        await document_store.create_document(doc_id, "resume", SOURCE, [chunk])
+        session = TranslationSession(doc_id, None, checkpointed={0: CHECKPOINT})
+        await session.translate_chunk(chunk, client, "", "")
+        await translate.checkpoints.flush()
+        doc = await document_store.get_document(doc_id, fields=["chunks_data"])
+        return doc["chunks_data"][0], await document_store.get_checkpoints(doc_id)
+
+    stored, remaining = asyncio.run(run())
+    return stored, remaining, completions.requests
+
+
+@pytest.mark.parametrize("honours_partial", [True, False])
+def test_partial_resume_produces_one_copy(monkeypatch, honours_partial):
+    stored, remaining, requests = _resume(monkeypatch, honours_partial, partial_resume=True)
+    assert requests[0]["messages"][-1] == {"role": "assistant", "content": CHECKPOINT, "partial": True}
+    assert stored["status"] == "completed"
+    assert stored["translated_text"] == TRANSLATION
+    assert remaining == {}
+
+
+def test_resume_retranslates_from_scratch_by_default(monkeypatch):
+    stored, _, requests = _resume(monkeypatch, honours_partial=False, partial_resume=False)
+    assert not any(m.get("partial") for m in requests[0]["messages"])
+    assert stored["translated_text"] == TRANSLATION
+
+
+def test_recovery_skips_chunks_still_in_flight(monkeypatch):
+    monkeypatch.setattr(translate.checkpoints, "interval", 0.05)
+    live, abandoned = str(uuid.uuid4()), str(uuid.uuid4())
+    chunk = {"chunk_index": 0, "raw_text": SOURCE, "translated_text": None, "status": "pending"}
+
+    async def run():
+        for doc_id in (live, abandoned):
+            await document_store.create_document(doc_id, "recovery", SOURCE, [chunk])
+            translate.checkpoints.record(doc_id, 0, CHECKPOINT)
+        await translate.checkpoints.flush()
+        # The abandoned chunk's process is gone; the live one keeps being refreshed
+        translate.checkpoints.release(abandoned, 0)
+        for _ in range(5):
+            await asyncio.sleep(translate.checkpoints.interval)
+            await translate.checkpoints.flush()
+        cutoff = (datetime.now() - timedelta(seconds=translate.checkpoints.stale_after)).isoformat()
+        stale = await document_store.get_checkpointed_document_ids(updated_before=cutoff)
+        translate.checkpoints.discard(live, 0)
+        return stale
+
+    stale = asyncio.run(run())
+    assert abandoned in stale
+    assert live not in stale
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from persistent_storage import DocumentExistsError, PersistentStore
+
+CHUNKS = [
+    {"chunk_index": i, "raw_text": f"Paragraph {i} about embodied intelligence.", "translated_text": "",
+     "status": "pending"}
+    for i in range(3)
+]
+
+
+def test_concurrent_initialization_builds_index_once(tmp_path):
+    db_path = tmp_path / "store.db"
+
+    async def seed():
+        store = PersistentStore(db_path)
+        for n in range(4):
+            await store.create_document(f"doc-{n}", f"Doc {n}", "content", CHUNKS)
+
+    asyncio.run(seed())
+    # An empty index makes the next startup rebuild it from documents
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM search_chunks")
+        conn.execute("INSERT INTO search_fts (search_fts) VALUES ('delete-all')")
+
+    async def start_workers():
+        stores = [PersistentStore(db_path) for _ in range(6)]
+        await asyncio.gather(*(store.get_all_settings() for store in stores))
+
+    asyncio.run(start_workers())
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM search_chunks").fetchone()[0] == 4 * len(CHUNKS)
+
+
+def test_update_chunk_invalidates_cached_document(tmp_path):
+    async def run():
+        store, other_worker = PersistentStore(tmp_path / "store.db"), PersistentStore(tmp_path / "store.db")
+        await store.create_document("doc", "Doc", "content", CHUNKS)
+        await store.get_document("doc", fields=["chunks_data"])
+        await other_worker.get_document("doc", fields=["chunks_data"])
+
+        await store.update_chunk("doc", 0, "第一段。", "completed")
+        mine = await store.get_document("doc", fields=["chunks_data"])
+        theirs = await other_worker.get_document("doc", fields=["chunks_data"])
+        return mine["chunks_data"][0], theirs["chunks_data"][0]
+
+    for chunk in asyncio.run(run()):
+        assert chunk["translated_text"] == "第一段。"
+        assert chunk["status"] == "completed"
+
+
+def test_compress_archive_restore_round_trip(tmp_path):
+    db_path = tmp_path / "store.db"
+    text = "Embodied agents plan and act in the physical world. " * 100
+    chunks = [{"chunk_index": 0, "raw_text": text, "translated_text": "", "status": "pending"}]
+
+    async def create():
+        store = PersistentStore(db_path)
+        await store.create_document("doc", "Round trip", text, chunks)
+        await store.update_chunk("doc", 0, "具身智能体在物理世界中规划和行动。" * 100, "completed")
+        await store.update_document_status("doc", "completed")
+        return await store.get_document("doc")
+
+    original = asyncio.run(create())
+    # Rewrite the row as a database from before compression would have stored it
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "UPDATE documents SET content_format = 0, original_content = ?, translated_content = ?, "
+            "chunks_data = ?, structure_index = NULL",
+            (original["original_content"], original["translated_content"], json.dumps(original["chunks_data"])),
+        )
+
+    async def round_trip():
+        store = PersistentStore(db_path)
+        compressed = await store.compress_documents()
+        assert await store.get_document("doc") == original
+        assert await store.archive_documents(datetime.now().isoformat()) == 1
+        assert await store.get_document("doc") is None
+        assert await store.search("physical") == []
+        archived = [doc["id"] for doc in await store.get_archived_documents()]
+
+        # An id taken again in the meantime blocks the restore
+        await store.create_document("doc", "Reused id", "other", [])
+        with pytest.raises(DocumentExistsError):
+            await store.restore_archived_document("doc")
+        await store.delete_document("doc")
+
+        assert await store.restore_archived_document("doc")
+        return compressed, archived, await store.get_document("doc"), await store.search("physical")
+
+    compressed, archived, restored, hits = asyncio.run(round_trip())
+    assert compressed == 1
+    assert archived == ["doc"]
+    for field in ("title", "original_content", "translated_content", "chunks_data", "status"):
+        assert restored[field] == original[field]
+    assert restored["version"] > original["version"]
+    assert [hit["doc_id"] for hit in hits] == ["doc"]
@@ -10,7 +10,21 @@ export async function GET(
   { params }: { params: { id: string } }
 ) {
   try {
-    const response = await fetch(`${BACKEND_URL}/api/documents/${params.id}`, { cache: 'no-store' });
+    // 透传字段投影/分块范围参数和 If-None-Match，以支持 304 Not Modified
+    const query = request.nextUrl.search;
+    const ifNoneMatch = request.headers.get('if-none-match');
+    const response = await fetch(`${BACKEND_URL}/api/documents/${params.id}${query}`, {
+      cache: 'no-store',
+      headers: ifNoneMatch ? { 'If-None-Match': ifNoneMatch } : undefined,
+    });
+    const etag = response.headers.get('etag');
+    const cacheHeaders: Record<string, string> = etag
+      ? { ETag: etag, 'Cache-Control': 'no-cache' }
+      : {};
+    
+    if (response.status === 304) {
+      return new NextResponse(null, { status: 304, headers: cacheHeaders });
+    }
     
     if (!response.ok) {
       return NextResponse.json(
@@ -20,7 +34,7 @@ export async function GET(
     }
     
     const data = await response.json();
-    return NextResponse.json(data);
+    return NextResponse.json(data, { headers: cacheHeaders });
   } catch (error) {
     console.error('API proxy error:', error);
     return NextResponse.json(